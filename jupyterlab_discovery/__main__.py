@@ -0,0 +1,134 @@
+"""Command line interface for reports on, and caching of, extension data."""
+
+# Copyright (c) Simula Research.
+# Distributed under the terms of the Modified BSD License.
+
+import argparse
+import json
+import logging
+import sys
+
+from tornado import gen
+from tornado.ioloop import IOLoop
+
+from .compatdb import export_database
+from .config import DiscoveryConfig
+
+
+# The number of seconds prefetched data stays valid by default:
+_PREFETCH_TTL = 7 * 24 * 3600
+
+
+def _make_config(args):
+    """Create the manager configuration from the command line arguments"""
+    config = DiscoveryConfig()
+    if args.registry:
+        config.registries = args.registry
+    if args.cache_dir:
+        config.shared_cache_dir = args.cache_dir
+    if args.compat_database:
+        config.compat_database = args.compat_database
+        config.offline = True
+    if getattr(args, 'ttl', None):
+        config.shared_cache_ttl = args.ttl
+        config.snapshot_max_age = args.ttl
+    return config
+
+
+def _get_reports(app_dirs, config, refresh, log):
+    """Run the outdated check for several app dirs in parallel"""
+    from jupyterlab.commands import get_app_dir
+    from .manager import ExtensionManager, SharedResources
+
+    @gen.coroutine
+    def run():
+        resources = SharedResources(log, config)
+        # Skip the listing snapshots, as the loop stops before they could be
+        # revalidated. Fresh snapshots are still written for the server:
+        managers = [ExtensionManager(log, app_dir, config, resources,
+                                     use_snapshot=False)
+                    for app_dir in app_dirs or [get_app_dir()]]
+        reports = yield [m.get_report(refresh=refresh) for m in managers]
+        raise gen.Return(reports)
+
+    return IOLoop.current().run_sync(run)
+
+
+def outdated(args, log):
+    """Print a JSON report of the installed extensions and their latest versions"""
+    reports = _get_reports(args.app_dir, _make_config(args), args.refresh, log)
+    json.dump(reports, sys.stdout, indent=2, sort_keys=True)
+    sys.stdout.write('\n')
+
+
+def prefetch(args, log):
+    """Populate the caches, e.g. while building an image"""
+    if not args.cache_dir:
+        log.warning('No --cache-dir given, only the listing snapshots are written')
+    # Always refresh, so that the caches are populated with fresh data:
+    _get_reports(args.app_dir, _make_config(args), True, log)
+
+
+def export_compatdb(args, log):
+    """Export a compatibility database for offline use"""
+    export_database(
+        args.path, args.registry[0] if args.registry else 'https://registry.npmjs.org/',
+        log, args.names)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m jupyterlab_discovery')
+    parser.add_argument('--debug', action='store_true', help='Log debug messages.')
+    subparsers = parser.add_subparsers(dest='command')
+
+    def add_common(subparser):
+        subparser.add_argument(
+            '--registry', action='append',
+            help='A registry to fetch package metadata from. Can be repeated.')
+
+    def add_pipeline(subparser):
+        add_common(subparser)
+        subparser.add_argument(
+            '--app-dir', action='append',
+            help='A lab app dir to check. Can be repeated. Defaults to the current app dir.')
+        subparser.add_argument(
+            '--cache-dir', help='The directory of the shared metadata cache.')
+        subparser.add_argument(
+            '--compat-database',
+            help='Use this compatibility database instead of the registry.')
+
+    sub = subparsers.add_parser('outdated', help=outdated.__doc__)
+    add_pipeline(sub)
+    sub.add_argument('--refresh', action='store_true',
+                     help='Ignore cached data.')
+    sub.set_defaults(func=outdated)
+
+    sub = subparsers.add_parser('prefetch', help=prefetch.__doc__)
+    add_pipeline(sub)
+    sub.add_argument(
+        '--ttl', type=float, default=_PREFETCH_TTL,
+        help=('The number of seconds the prefetched data stays valid, in the '
+              'shared cache and the listing snapshots. Servers keep using it for '
+              'this long, regardless of their shared_cache_ttl and '
+              'snapshot_max_age. Defaults to %(default)s (a week).'))
+    sub.set_defaults(func=prefetch)
+
+    sub = subparsers.add_parser('export-compatdb', help=export_compatdb.__doc__)
+    add_common(sub)
+    sub.add_argument('path', help='The database file to write.')
+    sub.add_argument('names', nargs='*', help=(
+        'The packages to include. Defaults to all packages with the '
+        'jupyterlab-extension keyword.'))
+    sub.set_defaults(func=export_compatdb)
+
+    args = parser.parse_args(argv)
+    if not getattr(args, 'func', None):
+        parser.print_help()
+        return 1
+    logging.basicConfig(level=logging.DEBUG if args.debug else logging.INFO)
+    args.func(args, logging.getLogger('jupyterlab_discovery'))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
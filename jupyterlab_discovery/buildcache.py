@@ -0,0 +1,127 @@
+"""A content-addressed cache of built lab bundles."""
+
+# Copyright (c) Simula Research.
+# Distributed under the terms of the Modified BSD License.
+
+import hashlib
+import json
+import os
+import shutil
+from threading import Lock
+
+from jupyterlab.commands import HERE
+
+from .rollback import _copy_part
+
+
+pjoin = os.path.join
+
+
+def _file_hash(path):
+    """Get the SHA-256 hash of a file, or None if it does not exist"""
+    try:
+        with open(path, 'rb') as fid:
+            return hashlib.sha256(fid.read()).hexdigest()
+    except (IOError, OSError):
+        return None
+
+
+class BuildCache(object):
+    """A cache of the `static` dir of the app dir, keyed by extension set.
+
+    The key is a hash of the version of the running lab, the yarn.lock
+    of its staging template, and the names and versions of the installed
+    extensions. When a set of extensions has been built before, its
+    build can be restored instead of rebuilt. Files are hardlinked
+    where possible. Only the `max_entries` most recently used
+    builds are kept.
+    """
+
+    def __init__(self, app_dir, logger, max_entries=3):
+        self.app_dir = app_dir
+        self.root = pjoin(app_dir, 'discovery', 'builds')
+        self.log = logger
+        self.max_entries = max_entries
+        self._lock = Lock()
+
+    def key(self, info):
+        """Compute the key of the extension set in an app info dict
+
+        Returns None if the build cannot be cached, as when there are
+        local or linked packages, whose content can change without
+        changing their version.
+        """
+        if self.max_entries <= 0:
+            return None
+        if info.get('local_extensions') or info.get('linked_packages'):
+            return None
+        extensions = sorted(
+            (name, data['version']) for name, data in info['extensions'].items())
+        # `info['version']` is the version of the last build, not of the running
+        # lab. The yarn.lock in the staging dir of the app dir is recreated by
+        # each build, so use the one of the staging template shipped with lab:
+        data = dict(
+            version=info['core_data']['jupyterlab']['version'],
+            yarn_lock=_file_hash(pjoin(HERE, 'staging', 'yarn.lock')),
+            extensions=extensions,
+            uninstalled_core=sorted(info.get('uninstalled_core', [])),
+        )
+        encoded = json.dumps(data, sort_keys=True).encode('utf-8')
+        return hashlib.sha256(encoded).hexdigest()
+
+    def restore(self, key):
+        """Restore the build of an extension set, if cached.
+
+        Returns whether the build was restored.
+        """
+        source = pjoin(self.root, key)
+        static = pjoin(self.app_dir, 'static')
+        old = static + '.discovery-old'
+        with self._lock:
+            if not os.path.isdir(source):
+                return False
+            try:
+                if os.path.isdir(static):
+                    shutil.rmtree(old, ignore_errors=True)
+                    os.rename(static, old)
+                _copy_part(source, static, True)
+            except (IOError, OSError) as e:
+                self.log.warning('Could not restore cached build: %s', e)
+                if os.path.isdir(old):
+                    shutil.rmtree(static, ignore_errors=True)
+                    os.rename(old, static)
+                return False
+            shutil.rmtree(old, ignore_errors=True)
+            # Mark as recently used:
+            os.utime(source, None)
+        self.log.info('Restored cached build of the extension set %s', key)
+        return True
+
+    def store(self, key):
+        """Store the current build of the app dir under a key"""
+        if self.max_entries <= 0:
+            return
+        static = pjoin(self.app_dir, 'static')
+        target = pjoin(self.root, key)
+        temp = target + '.tmp'
+        with self._lock:
+            try:
+                shutil.rmtree(temp, ignore_errors=True)
+                _copy_part(static, temp, True)
+                shutil.rmtree(target, ignore_errors=True)
+                os.rename(temp, target)
+            except (IOError, OSError) as e:
+                self.log.debug('Could not cache build: %s', e)
+                shutil.rmtree(temp, ignore_errors=True)
+                return
+            self._prune()
+
+    def _prune(self):
+        """Remove all but the most recently used builds"""
+        entries = []
+        for name in os.listdir(self.root):
+            path = pjoin(self.root, name)
+            if not name.endswith('.tmp') and os.path.isdir(path):
+                entries.append((os.path.getmtime(path), path))
+        for _, path in sorted(entries, reverse=True)[self.max_entries:]:
+            shutil.rmtree(path, ignore_errors=True)
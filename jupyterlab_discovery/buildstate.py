@@ -0,0 +1,166 @@
+"""Structured check of which extensions differ from the last build."""
+
+# Copyright (c) Simula Research.
+# Distributed under the terms of the Modified BSD License.
+
+import hashlib
+import json
+import os
+
+from .cache import stat_key
+
+
+pjoin = os.path.join
+
+# The name of the file the manifest of the last build is persisted to:
+_MANIFEST_NAME = 'discovery-build-manifest.json'
+
+
+def _hash_file(path):
+    """Compute the content hash of a file"""
+    sha = hashlib.sha256()
+    with open(path, 'rb') as fid:
+        for chunk in iter(lambda: fid.read(65536), b''):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+class BuildState(object):
+    """Tracks the state of the last build of an app dir.
+
+    The manifest of the last build (package name, version and content
+    hash) is derived from the package.json of the built application, and
+    persisted in the staging directory. It is only recomputed when the
+    built application changes. Content hashes of installed packages are
+    cached by file stats, so unchanged package files are not re-read.
+    """
+
+    def __init__(self, app_dir, logger, packages):
+        self.app_dir = app_dir
+        self.log = logger
+        self.packages = packages
+        self._manifest = None
+        # Content hashes keyed by path, as [stat key, hash] pairs:
+        self._hashes = {}
+        self._dirty = False
+        self._load()
+
+    def check(self, info):
+        """Get the packages scheduled for install, uninstall or update.
+
+        Args:
+            info: The app info, as returned by `get_app_info`.
+
+        Returns a dict with lists of package names for the keys
+        'install', 'uninstall' and 'update'.
+        """
+        status = {'install': [], 'uninstall': [], 'update': []}
+        manifest = self._get_manifest()
+        if manifest is None:
+            # No built application
+            return status
+        built = manifest['packages']
+        current = self._current_packages(info)
+        for name, entry in current.items():
+            if name not in built:
+                status['install'].append(name)
+            elif built[name] != entry:
+                status['update'].append(name)
+        for name in built:
+            if name not in current:
+                status['uninstall'].append(name)
+        if self._dirty:
+            self._save()
+        return status
+
+    def _current_packages(self, info):
+        """Get the manifest entries of the packages that should be built"""
+        packages = {}
+        core_jlab = info['core_data']['jupyterlab']
+        uninstalled_core = info.get('uninstalled_core', [])
+        for key in ('extensions', 'mimeExtensions'):
+            for name in core_jlab.get(key, {}):
+                if name not in uninstalled_core:
+                    packages[name] = dict(version=None, hash=None)
+        for name, data in info['extensions'].items():
+            packages[name] = dict(
+                version=data['version'],
+                hash=self._get_hash(data['path']),
+            )
+        return packages
+
+    def _get_manifest(self):
+        """Get the manifest of the last build, updating it if needed"""
+        pkg_path = pjoin(self.app_dir, 'static', 'package.json')
+        if not os.path.exists(pkg_path):
+            return None
+        key = stat_key(pkg_path)
+        if self._manifest is not None and self._manifest['key'] == key:
+            return self._manifest
+        with open(pkg_path) as fid:
+            static_data = json.load(fid)
+        jlab = static_data['jupyterlab']
+        deps = static_data.get('dependencies', {})
+        names = set(jlab.get('extensions', {})) | set(jlab.get('mimeExtensions', {}))
+        packages = {}
+        for name in names:
+            spec = deps.get(name, '')
+            path = None
+            if spec.startswith('file:'):
+                # Lab writes the paths relative to the staging directory
+                path = os.path.normpath(
+                    pjoin(self.app_dir, 'staging', spec[len('file:'):]))
+            if path and os.path.exists(path):
+                # An installed or linked extension
+                packages[name] = dict(
+                    version=self._package_version(path),
+                    hash=self._get_hash(path),
+                )
+            else:
+                packages[name] = dict(version=None, hash=None)
+        self._manifest = dict(key=key, packages=packages)
+        self._dirty = True
+        return self._manifest
+
+    def _package_version(self, path):
+        """Get the version of a package tarball or directory"""
+        if os.path.isdir(path):
+            return self.packages.read_json(pjoin(path, 'package.json'))['version']
+        return self.packages.read_package(path)['version']
+
+    def _get_hash(self, path):
+        """Get the content hash of a package file, using the cache if possible"""
+        if not os.path.isfile(path):
+            # Linked/local packages are directories, compare them by version only
+            return None
+        key = stat_key(path)
+        cached = self._hashes.get(path, None)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+        digest = _hash_file(path)
+        self._hashes[path] = [key, digest]
+        self._dirty = True
+        return digest
+
+    @property
+    def _manifest_path(self):
+        return pjoin(self.app_dir, 'staging', _MANIFEST_NAME)
+
+    def _load(self):
+        """Load the persisted manifest, if any"""
+        try:
+            with open(self._manifest_path) as fid:
+                data = json.load(fid)
+            self._manifest = data['manifest']
+            self._hashes = data['hashes']
+        except (IOError, OSError, ValueError, KeyError):
+            pass
+
+    def _save(self):
+        """Persist the manifest"""
+        try:
+            with open(self._manifest_path, 'w') as fid:
+                json.dump(dict(manifest=self._manifest, hashes=self._hashes), fid)
+            self._dirty = False
+        except (IOError, OSError) as e:
+            self.log.debug('Could not persist build manifest: %s', e)
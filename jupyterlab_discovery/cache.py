@@ -0,0 +1,222 @@
+"""Caches for package data and registry metadata."""
+
+# Copyright (c) Simula Research.
+# Distributed under the terms of the Modified BSD License.
+
+from collections import OrderedDict
+import json
+import os
+import re
+import sqlite3
+from threading import Lock
+import time
+
+
+# An exact package version, as opposed to a range, tag or URL:
+_EXACT_VERSION = re.compile(r'^\d+\.\d+\.\d+(-[0-9A-Za-z.-]+)?(\+[0-9A-Za-z.-]+)?$')
+
+
+def stat_key(path):
+    """A key that changes whenever the file at path is modified"""
+    st = os.stat(path)
+    return [st.st_size, st.st_mtime, st.st_ino]
+
+
+class PackageCache(object):
+    """A bounded cache of package data read from tarballs or package.json files.
+
+    Entries are keyed by path, and are invalidated when the size,
+    modification time or inode of the file changes. When the cache is
+    full, the least recently used entry is evicted.
+    """
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = Lock()
+
+    def read_package(self, path):
+        """Read the package data of a tarball, like `_read_package`"""
+        # Imported here, so that the caches can be used without lab:
+        from jupyterlab.commands import _read_package
+        return self._get(path, _read_package)
+
+    def read_json(self, path):
+        """Read the package data of a package.json file"""
+        return self._get(path, _load_json)
+
+    def _get(self, path, loader):
+        key = stat_key(path)
+        with self._lock:
+            entry = self._entries.pop(path, None)
+            if entry is not None and entry[0] == key:
+                # Reinsert to mark as most recently used
+                self._entries[path] = entry
+                return dict(entry[1])
+        data = loader(path)
+        with self._lock:
+            self._entries[path] = (key, data)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return dict(data)
+
+
+class MetadataCache(object):
+    """A bounded cache of reduced packuments, keyed by package name.
+
+    When the cache is full, the least recently used entry is evicted.
+    """
+
+    def __init__(self, max_entries=512):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, name, default=None):
+        with self._lock:
+            metadata = self._entries.pop(name, None)
+            if metadata is None:
+                return default
+            # Reinsert to mark as most recently used
+            self._entries[name] = metadata
+            return metadata
+
+    def __setitem__(self, name, metadata):
+        with self._lock:
+            self._entries.pop(name, None)
+            self._entries[name] = metadata
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+def _load_json(path):
+    with open(path) as fid:
+        return json.load(fid)
+
+
+# The version of the schema, stored as the user_version of the database:
+_SCHEMA_VERSION = 1
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS metadata (
+    name TEXT PRIMARY KEY,
+    data TEXT NOT NULL,
+    expires REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS compatible (
+    name TEXT NOT NULL,
+    core_version TEXT NOT NULL,
+    version TEXT,
+    expires REAL NOT NULL,
+    PRIMARY KEY (name, core_version)
+);
+"""
+
+# Caches written before entries had their own expiry are discarded:
+_DROP_OLD_SCHEMA = """
+DROP TABLE IF EXISTS metadata;
+DROP TABLE IF EXISTS compatible;
+"""
+
+
+class SharedCache(object):
+    """A registry metadata cache shared by all servers on a node.
+
+    On JupyterHub nodes, every single-user server checks the same
+    packages. This cache is an SQLite database in a shared directory,
+    storing reduced packuments and the latest compatible version of
+    each package for a given lab version, so that these are only
+    computed once per node. SQLite locks the database file for
+    concurrent access from several processes.
+
+    Errors accessing the database are logged, and treated as cache misses.
+    Each entry expires `ttl` seconds after it was written, as given by
+    the writer, so that e.g. caches populated while building an image
+    can outlive the entries written by the servers.
+
+    The database is created with the default permissions. Every user
+    that can write to it is trusted by all servers using it, so it
+    should only be shared between users that trust each other.
+    """
+
+    def __init__(self, directory, ttl, logger):
+        self.path = os.path.join(directory, 'discovery-cache.sqlite')
+        self.ttl = ttl
+        self.log = logger
+        try:
+            if not os.path.exists(directory):
+                os.makedirs(directory)
+            conn = self._connect()
+            try:
+                version = conn.execute('PRAGMA user_version').fetchone()[0]
+                if version != _SCHEMA_VERSION:
+                    conn.executescript(_DROP_OLD_SCHEMA)
+                conn.executescript(_SCHEMA)
+                conn.execute('PRAGMA user_version = %d' % _SCHEMA_VERSION)
+            finally:
+                conn.close()
+        except (OSError, sqlite3.Error) as e:
+            self.log.warning('Could not initialize shared cache %s: %s', self.path, e)
+
+    def get_metadata(self, name):
+        """Get a reduced packument, or None if it is not cached"""
+        row = self._fetch(
+            'SELECT data FROM metadata WHERE name = ? AND expires > ?',
+            (name, time.time()))
+        return json.loads(row[0]) if row else None
+
+    def set_metadata(self, name, metadata):
+        """Store a reduced packument"""
+        self._execute(
+            'INSERT OR REPLACE INTO metadata VALUES (?, ?, ?)',
+            (name, json.dumps(metadata), time.time() + self.ttl))
+
+    def get_compatible(self, name, core_version):
+        """Get the latest compatible version of a package for a lab version.
+
+        Returns a (hit, version) tuple, where version is None if the
+        package has no compatible version. Entries that are not exact
+        versions are ignored. Callers should still check that the version
+        exists in the packument of the package.
+        """
+        row = self._fetch(
+            'SELECT version FROM compatible'
+            ' WHERE name = ? AND core_version = ? AND expires > ?',
+            (name, core_version, time.time()))
+        if row is None:
+            return False, None
+        if row[0] is not None and not _EXACT_VERSION.match(row[0]):
+            self.log.warning('Ignoring invalid cached version %r of %s', row[0], name)
+            return False, None
+        return True, row[0]
+
+    def set_compatible(self, name, core_version, version):
+        """Store the latest compatible version of a package for a lab version"""
+        self._execute(
+            'INSERT OR REPLACE INTO compatible VALUES (?, ?, ?, ?)',
+            (name, core_version, version, time.time() + self.ttl))
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    def _fetch(self, query, args):
+        try:
+            conn = self._connect()
+            try:
+                return conn.execute(query, args).fetchone()
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            self.log.debug('Shared cache lookup failed: %s', e)
+            return None
+
+    def _execute(self, query, args):
+        try:
+            conn = self._connect()
+            try:
+                with conn:
+                    conn.execute(query, args)
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            self.log.debug('Shared cache update failed: %s', e)
@@ -0,0 +1,138 @@
+"""A prebuilt database of extension versions, for offline use."""
+
+# Copyright (c) Simula Research.
+# Distributed under the terms of the Modified BSD License.
+
+import json
+import os
+import sqlite3
+from threading import Lock
+import time
+
+from .registry import (
+    COMPAT_FIELDS, fetch_package_metadata, search_extension_names
+)
+
+try:
+    from urllib.error import URLError
+    from urllib.parse import quote
+except ImportError:
+    from urllib import quote
+    from urllib2 import URLError
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS versions (
+    name TEXT NOT NULL,
+    version TEXT NOT NULL,
+    dependencies TEXT NOT NULL,
+    jupyterlab TEXT,
+    PRIMARY KEY (name, version)
+);
+CREATE TABLE IF NOT EXISTS info (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+class CompatDatabase(object):
+    """A database mapping packages to their versions and dependencies.
+
+    For each version, the database holds the dependency ranges used for
+    compatibility checks, and the `jupyterlab` metadata of the package
+    (including any discovery metadata). Lookups by name are indexed.
+
+    The database is created by `export_database` on a machine with
+    registry access, and can then be used on machines without it.
+    Unless `writable` is set, the database is opened read-only, and
+    an IOError is raised if it does not exist.
+    """
+
+    def __init__(self, path, writable=False):
+        self.path = path
+        self._lock = Lock()
+        # The connection is shared by the executor threads:
+        if writable:
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            self._conn.executescript(_SCHEMA)
+        elif not os.path.isfile(path):
+            raise IOError('Compatibility database not found: %s' % path)
+        else:
+            uri = 'file:%s?mode=ro' % quote(os.path.abspath(path))
+            try:
+                self._conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+            except TypeError:
+                # Python 2 does not support URIs
+                self._conn = sqlite3.connect(path, check_same_thread=False)
+
+    def get_metadata(self, name):
+        """Get the reduced packument of a package, or None if it is not known"""
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT version, dependencies FROM versions WHERE name = ?',
+                (name,)).fetchall()
+        if not rows:
+            return None
+        return dict(
+            name=name,
+            versions=dict((v, dict(dependencies=json.loads(d))) for v, d in rows),
+        )
+
+    def get_discovery(self, name, version):
+        """Get the discovery metadata of a package version, or None"""
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT jupyterlab FROM versions WHERE name = ? AND version = ?',
+                (name, version)).fetchone()
+        if row is None or row[0] is None:
+            return None
+        return json.loads(row[0]).get('discovery', None)
+
+    def add_metadata(self, metadata):
+        """Add a packument, reduced to the fields in the database"""
+        with self._conn:
+            self._conn.executemany(
+                'INSERT OR REPLACE INTO versions VALUES (?, ?, ?, ?)',
+                [(metadata['name'], version,
+                  json.dumps(data.get('dependencies', {})),
+                  json.dumps(data['jupyterlab']) if 'jupyterlab' in data else None)
+                 for version, data in metadata['versions'].items()])
+
+    def set_info(self, key, value):
+        """Store information about the database itself"""
+        with self._conn:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO info VALUES (?, ?)', (key, value))
+
+    def close(self):
+        self._conn.close()
+
+
+def export_database(path, registry, logger, names=None, timeout=None):
+    """Export a compatibility database from a registry.
+
+    Args:
+        path: The path of the database file to write.
+        registry: The registry to fetch package metadata from.
+        logger: The logger to use.
+        names: The packages to include. Defaults to all packages with the
+            jupyterlab-extension keyword.
+        timeout: The timeout of each registry request, in seconds.
+    """
+    if not names:
+        names = search_extension_names(registry, logger, timeout=timeout)
+    db = CompatDatabase(path, writable=True)
+    try:
+        for name in names:
+            try:
+                metadata = fetch_package_metadata(
+                    registry, name, logger, timeout=timeout,
+                    fields=COMPAT_FIELDS + ('jupyterlab',), full=True)
+            except URLError:
+                continue
+            db.add_metadata(metadata)
+        db.set_info('exported', str(time.time()))
+    finally:
+        db.close()
+    return names
@@ -0,0 +1,223 @@
+"""Configuration of the discovery server extension."""
+
+# Copyright (c) Simula Research.
+# Distributed under the terms of the Modified BSD License.
+
+from traitlets import Bool, Float, Integer, List, TraitError, Unicode, validate
+from traitlets.config import Configurable
+
+
+class DiscoveryConfig(Configurable):
+    """Configurable options for the discovery server extension.
+
+    These can be set in the notebook configuration files, e.g.
+    `c.DiscoveryConfig.registries = ['https://registry.npmjs.org/']`.
+    """
+
+    startup_delay = Float(-1.0, help="""
+        The number of seconds after server start to create the extension
+        manager, which starts the first check for outdated extensions.
+        If negative, this is deferred until the first request.
+        """).tag(config=True)
+
+    snapshot_max_age = Float(86400.0, help="""
+        The number of seconds a listing snapshot saved by this server may
+        be served at startup, while the listing is recomputed in the
+        background. Older snapshots are discarded.
+        """).tag(config=True)
+
+    registries = List(Unicode(), help="""
+        An ordered list of npm registries/mirrors to fetch package metadata
+        from. If empty, the registry configured for yarn in the lab app
+        dir is used.
+        """).tag(config=True)
+
+    request_timeout = Float(30.0, help="""
+        The number of seconds before a single request to a registry
+        times out.
+        """).tag(config=True)
+
+    outdated_timeout = Float(300.0, help="""
+        The number of seconds the check for outdated extensions may take
+        in total. When it is exceeded, the check is aborted, and the
+        results for the packages checked so far are used.
+        """).tag(config=True)
+
+    hedge_delay = Float(2.0, help="""
+        The number of seconds to wait for a registry to respond before
+        sending the same request to the next registry in line.
+        """).tag(config=True)
+
+    failure_threshold = Integer(3, help="""
+        The number of consecutive failures after which a registry is
+        skipped until `circuit_reset` seconds have passed.
+        """).tag(config=True)
+
+    circuit_reset = Float(60.0, help="""
+        The number of seconds to skip a failing registry before trying
+        it again.
+        """).tag(config=True)
+
+    package_cache_size = Integer(256, help="""
+        The maximum number of package files (tarballs and package.json)
+        to keep the parsed data of in memory.
+        """).tag(config=True)
+
+    metadata_cache_size = Integer(512, help="""
+        The maximum number of packages to keep the registry metadata of
+        in memory.
+        """).tag(config=True)
+
+    compat_check_workers = Integer(2, help="""
+        The number of threads that look up registry metadata for checks
+        of the compatibility of search results with lab.
+        """).tag(config=True)
+
+    compat_check_timeout = Float(10.0, help="""
+        The number of seconds a compatibility check of search results may
+        take. Packages that have not been checked by then are reported
+        with an unknown status.
+        """).tag(config=True)
+
+    shared_cache_dir = Unicode('', help="""
+        A directory for a registry metadata cache shared by all servers on
+        the node, e.g. the single-user servers of a JupyterHub deployment.
+        It must be writable by the users sharing it, who must trust each
+        other, as the cached data decides which versions are installed.
+        If empty, no shared cache is used.
+        """).tag(config=True)
+
+    shared_cache_ttl = Float(3600.0, help="""
+        The number of seconds the entries this server writes to the shared
+        cache stay valid.
+        """).tag(config=True)
+
+    offline = Bool(False, help="""
+        Whether to run without registry access. In offline mode, the
+        latest compatible versions are looked up in `compat_database`.
+        """).tag(config=True)
+
+    compat_database = Unicode('', help="""
+        The path of a compatibility database exported with
+        `python -m jupyterlab_discovery export-compatdb`, used in offline mode.
+        It is opened read-only, and the extension manager fails to start
+        if it does not exist.
+        """).tag(config=True)
+
+    mutation_rate = Float(0.2, help="""
+        The number of install, uninstall, enable and disable requests per
+        second each user may make on average. Zero disables the limit.
+        """).tag(config=True)
+
+    mutation_burst = Integer(10, help="""
+        The number of mutation requests each user may make in a burst.
+        """).tag(config=True)
+
+    global_mutation_rate = Float(1.0, help="""
+        The number of mutation requests per second all users together may
+        make on average. Zero disables the limit.
+        """).tag(config=True)
+
+    global_mutation_burst = Integer(20, help="""
+        The number of mutation requests all users together may make in a burst.
+        """).tag(config=True)
+
+    refresh_rate = Float(0.1, help="""
+        The number of refreshes of the outdated extensions each user may
+        request per second on average. Zero disables the limit.
+        """).tag(config=True)
+
+    refresh_burst = Integer(3, help="""
+        The number of refreshes each user may request in a burst.
+        """).tag(config=True)
+
+    max_pending_mutations = Integer(10, help="""
+        The number of mutation requests that may wait to complete before
+        further mutation requests are rejected. Zero disables the limit.
+        """).tag(config=True)
+
+    max_rollback_snapshots = Integer(3, help="""
+        The number of app dir snapshots to keep for rollbacks. A snapshot
+        is taken before each install, uninstall, enable or disable. Zero
+        disables snapshots.
+        """).tag(config=True)
+
+    tarball_store_size = Integer(64, help="""
+        The number of package versions to keep the validated tarballs of
+        in the app dir, for installs that skip the registry. The least
+        recently used tarballs are removed first.
+        """).tag(config=True)
+
+    build_delay = Float(5, help="""
+        The number of seconds to wait for further build requests before
+        starting a build. All requests made in the meantime are served by
+        the same build.
+        """).tag(config=True)
+
+    build_max_delay = Float(60, help="""
+        The maximal number of seconds a build is delayed by further build
+        requests.
+        """).tag(config=True)
+
+    build_cache_size = Integer(3, help="""
+        The number of builds of different extension sets to keep, so that
+        they can be restored instead of rebuilt. Zero disables the cache.
+        """).tag(config=True)
+
+    nice_level = Integer(10, help="""
+        The niceness to run npm and build subprocesses with. Zero runs
+        them at normal priority.
+        """).tag(config=True)
+
+    ionice_class = Integer(2, help="""
+        The ionice scheduling class to run npm and build subprocesses with:
+        1 (realtime), 2 (best-effort) or 3 (idle). Zero disables ionice.
+        """).tag(config=True)
+
+    ionice_level = Integer(7, help="""
+        The ionice priority (0-7) within the best-effort class.
+        """).tag(config=True)
+
+    memory_limit = Unicode('', help="""
+        The memory limit of npm and build subprocesses, e.g. '2G'. Only
+        applied where systemd-run and cgroup v2 are available.
+        """).tag(config=True)
+
+    cpu_quota = Unicode('', help="""
+        The CPU quota of npm and build subprocesses, e.g. '200%' for two
+        cores. Only applied where systemd-run and cgroup v2 are available.
+        """).tag(config=True)
+
+    max_concurrent_builds = Integer(1, help="""
+        The number of builds that may run at the same time. If
+        shared_cache_dir is set, the limit holds for all servers on the
+        node sharing it, otherwise for this server only. Must be at least 1.
+        """).tag(config=True)
+
+    @validate('max_concurrent_builds')
+    def _validate_max_concurrent_builds(self, proposal):
+        if proposal['value'] < 1:
+            raise TraitError('max_concurrent_builds must be at least 1')
+        return proposal['value']
+
+    max_subprocesses = Integer(4, help="""
+        The number of npm subprocesses the server extension runs at the
+        same time, outside of installs and builds.
+        """).tag(config=True)
+
+    subprocess_timeout = Integer(300, help="""
+        The timeout of each npm subprocess, in seconds, after which it is
+        killed together with its child processes.
+        """).tag(config=True)
+
+    app_dirs = List(Unicode(), help="""
+        Additional lab app dirs that may be managed, besides the app dir
+        of the server. Clients select one by the `app_dir` argument of
+        each request. The managers of all app dirs share their caches.
+        """).tag(config=True)
+
+    enable_profiling = Bool(False, help="""
+        Whether to enable the /discovery/api/profile endpoint, which
+        profiles the listing of installed extensions on request. Only
+        enable it for diagnosis, as profiles reveal server internals.
+        """).tag(config=True)
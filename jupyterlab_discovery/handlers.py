@@ -8,271 +8,103 @@ try:
 except ImportError:
     from StringIO import StringIO
 import json
-from subprocess import check_output, CalledProcessError, TimeoutExpired, STDOUT
+import marshal
 import os
-import re
 
-from concurrent.futures import ThreadPoolExecutor
-from threading import Event
-
-from ipython_genutils.tempdir import TemporaryDirectory
-from notebook.base.handlers import APIHandler
-from tornado import gen, web
+from ipython_genutils.py3compat import string_types
+from notebook.base.handlers import APIHandler, IPythonHandler
+from notebook.base.zmqhandlers import WebSocketMixin
+from tornado import gen, web, websocket
 from tornado.ioloop import IOLoop
-from tornado.concurrent import run_on_executor
 
-from jupyterlab.jlpmapp import which, YARN_PATH, HERE as jlab_dir
-from jupyterlab.commands import (
-    get_app_info, install_extension, uninstall_extension,
-    enable_extension, disable_extension, _read_package,
-    _AppHandler, _fetch_package_metadata, _semver_key,
-    _validate_compatibility, _validate_extension
-)
 
-try:
-    from urllib.error import URLError
-except ImportError:
-    from urllib2 import URLError
-
-
-def _make_extension_entry(name, description, enabled, core, latest_version,
-                          installed_version, status, installed=None):
-    """Create an extension entry that can be sent to the client"""
-    ret = dict(
-        name=name,
-        description=description,
-        enabled=enabled,
-        core=core,
-        latest_version=latest_version,
-        installed_version=installed_version,
-        status=status,
-    )
-    if installed is not None:
-        ret['installed'] = installed
-    return ret
-
-
-def _ensure_compat_errors(info, app_dir, logger):
-    """Ensure that the app info has compat_errors field"""
-    handler = _AppHandler(app_dir, logger)
-    info['compat_errors'] = handler._get_extension_compat()
-
-
-_message_map = {
-    'install': re.compile(r'(?P<name>.*) needs to be included in build'),
-    'uninstall': re.compile(r'(?P<name>.*) needs to be removed from build'),
-    'update': re.compile(r'(?P<name>.*) changed from (?P<oldver>.*) to (?P<newver>.*)'),
-}
-
-def _build_check_info(app_dir, logger):
-    """Get info about packages scheduled for (un)install/update"""
-    handler = _AppHandler(app_dir, logger)
-    messages = handler.build_check(fast=True)
-    # Decode the messages into a dict:
-    status = {'install': [], 'uninstall': [], 'update': []}
-    for msg in messages:
-        for key, pattern in _message_map.items():
-            match = pattern.match(msg)
-            if match:
-                status[key].append(match.group('name'))
-    return status
-
-
-class ExtensionManager(object):
-    executor = ThreadPoolExecutor(max_workers=5)
-
-    def __init__(self, log, app_dir):
-        self.log = log
-        self.app_dir = app_dir
-        self._outdated = None
-        # Start fetching data on outdated extensions immediately
-        IOLoop.current().spawn_callback(self._get_outdated)
+def _normalize(path):
+    return os.path.normcase(os.path.abspath(os.path.expanduser(path)))
 
-    @gen.coroutine
-    def list_extensions(self):
-        """Handle a request for all installed extensions"""
-        info = get_app_info(app_dir=self.app_dir, logger=self.log)
-        build_check_info = _build_check_info(self.app_dir, self.log)
-        _ensure_compat_errors(info, self.app_dir, self.log)
-        extensions = []
-        # TODO: Ensure loops can run in parallel
-        for name, data in info['extensions'].items():
-            status = 'ok'
-            pkg_info = yield self._get_pkg_info(name, data)
-            if info['compat_errors'].get(name, None):
-                status = 'error'
-            else:
-                for packages in build_check_info.values():
-                    if name in packages:
-                        status = 'warning'
-            extensions.append(_make_extension_entry(
-                name=name,
-                description=pkg_info['description'],
-                enabled=(name not in info['disabled']),
-                core=False,
-                # Use wanted version to ensure we limit ourselves
-                # within semver restrictions
-                latest_version=pkg_info['latest_version'],
-                installed_version=data['version'],
-                status=status,
-            ))
-        for name in build_check_info['uninstall']:
-            data = yield self._get_scheduled_uninstall_info(name)
-            extensions.append(_make_extension_entry(
-                name=name,
-                description=data['description'],
-                installed=False,
-                enabled=False,
-                core=False,
-                latest_version=data['version'],
-                installed_version=data['version'],
-                status='warning',
-            ))
-        raise gen.Return(extensions)
-
-    @run_on_executor
-    def install(self, extension):
-        """Handle an install/update request"""
-        try:
-            install_extension(extension, app_dir=self.app_dir, logger=self.log)
-        except ValueError as e:
-            raise gen.Return(dict(status='error', message=str(e)))
-        raise gen.Return(dict(status='ok',))
-
-    @run_on_executor
-    def uninstall(self, extension):
-        """Handle an uninstall request"""
-        did_uninstall = uninstall_extension(extension, app_dir=self.app_dir, logger=self.log)
-        raise gen.Return(dict(status='ok' if did_uninstall else 'error',))
-
-    @run_on_executor
-    def enable(self, extension):
-        """Handle an enable request"""
-        enable_extension(extension, app_dir=self.app_dir, logger=self.log)
-        raise gen.Return(dict(status='ok',))
-
-    @run_on_executor
-    def disable(self, extension):
-        """Handle a disable request"""
-        disable_extension(extension, app_dir=self.app_dir, logger=self.log)
-        raise gen.Return(dict(status='ok',))
 
-    @gen.coroutine
-    def _get_pkg_info(self, name, data):
-        """Get information about a package"""
-        info = _read_package(data['path'])
-
-        # Get latest version that is compatible with current lab:
-        outdated = yield self._get_outdated()
-        if outdated and name in outdated:
-            info['latest_version'] = outdated[name]
-        else:
-            # Fallback to indicating that current is latest
-            info['latest_version'] = info['version']
+class LazyManager(object):
+    """Creates the extension managers when they are first needed.
 
-        raise gen.Return(info)
+    This keeps loading the server extension lightweight: the lab
+    commands are only imported, and the first check for outdated
+    extensions only started, once a manager is created.
 
-    def _get_outdated(self):
-        """Get a Future to information from `npm/yarn outdated`.
+    Besides the default app dir, the app dirs in the `app_dirs`
+    allowlist of the config can be managed. Each app dir gets its own
+    manager, but the managers share their caches and pools.
+    """
 
-        This will cache the results. To refresh the cache, set
-        self._outdated to None before calling. To bypass the cache,
-        call self._load_outdated directly.
-        """
-        # Ensure self._outdated is a Future for data on outdated extensions
-        if self._outdated is None:
-            self._outdated = self._load_outdated()
-        # Return the Future
-        return self._outdated
+    def __init__(self, log, app_dir, config):
+        self.log = log
+        self.app_dir = app_dir
+        self.config = config
+        self._managers = {}
+        self._resources = None
 
-    def refresh_outdated(self):
-        self._outdated = self._load_outdated()
-        return self._outdated
+    def get(self, app_dir=None):
+        """Get the extension manager of an app dir, creating it if needed
 
-    @gen.coroutine
-    def _load_outdated(self):
-        """Get the latest compatible version"""
-        info = get_app_info(app_dir=self.app_dir, logger=self.log)
-        data = yield self.executor.submit(
-            self._latest_compatible_package_versions,
-            tuple(info['extensions'].keys())
-        )
-        return data
-
-    def _latest_compatible_package_versions(self, names):
-        """Get the latest compatible version of a list of packages.
-
-        This is a variant of similar code in lab app, but optimized
-        for checking several packages in one go.
+        Without an app dir, the manager of the default app dir is
+        returned. Raises ValueError for app dirs not in the allowlist.
         """
-        handler = _AppHandler(self.app_dir, self.log)
-        core_data = handler.info['core_data']
-
-        keys = []
-        for name in names:
-            try:
-                metadata = _fetch_package_metadata(handler.registry, name, self.log)
-            except URLError:
-                continue
-            versions = metadata.get('versions', [])
-
-            # Sort pre-release first, as we will reverse the sort:
-            def sort_key(key_value):
-                return _semver_key(key_value[0], prerelease_first=True)
-
-            for version, data in sorted(versions.items(),
-                                        key=sort_key,
-                                        reverse=True):
-                deps = data.get('dependencies', {})
-                errors = _validate_compatibility(name, deps, core_data)
-                if not errors:
-                    # Found a compatible version
-                    keys.append('%s@%s' % (name, version))
-                    break  # break inner for
-
-
-        versions = {}
-        if not keys:
-            return versions
-        with TemporaryDirectory() as tempdir:
-            ret = handler._run([which('npm'), 'pack'] + keys, cwd=tempdir, quiet=True)
-            if ret != 0:
-                msg = '"%s" is not a valid npm package'
-                raise ValueError(msg % keys)
-
-            for key in keys:
-                fname = key[0].replace('@', '') + key[1:].replace('@', '-').replace('/', '-') + '.tgz'
-                data = _read_package(os.path.join(tempdir, fname))
-                # Verify that the version is a valid extension.
-                if not _validate_extension(data):
-                    # Valid
-                    versions[key] = data['version']
-        return versions
-
-
-    @run_on_executor
-    def _get_scheduled_uninstall_info(self, name):
-        """Get information about a package that is scheduled for uninstallation"""
-        target = os.path.join(
-            self.app_dir, 'staging', 'node_modules', name, 'package.json')
-        if os.path.exists(target):
-            with open(target) as fid:
-                return json.load(fid)
-        else:
-            return None
+        from jupyterlab.commands import get_app_dir
+        from .manager import ExtensionManager, SharedResources
+        default = _normalize(self.app_dir or get_app_dir())
+        app_dir = default if app_dir is None else _normalize(app_dir)
+        if app_dir != default and \
+                app_dir not in [_normalize(d) for d in self.config.app_dirs]:
+            raise ValueError('App dir is not in the allowlist: %s' % app_dir)
+        if app_dir not in self._managers:
+            if self._resources is None:
+                self._resources = SharedResources(self.log, self.config)
+            self._managers[app_dir] = ExtensionManager(
+                self.log, app_dir, self.config, self._resources)
+        return self._managers[app_dir]
+
+
+class ManagerMixin(object):
+    """Mixin for handlers that use the extension manager
+
+    The app dir to manage can be selected by the `app_dir` argument.
+    """
 
+    def initialize(self, manager):
+        self._lazy_manager = manager
 
-class ExtensionHandler(APIHandler):
+    @property
+    def manager(self):
+        try:
+            return self._lazy_manager.get(self.get_argument('app_dir', None))
+        except ValueError as e:
+            raise web.HTTPError(403, str(e))
 
-    def initialize(self, manager):
-        self.manager = manager
+
+class ExtensionHandler(ManagerMixin, APIHandler):
+
+    def initialize(self, manager, limits):
+        super(ExtensionHandler, self).initialize(manager)
+        self.limits = limits
+
+    def _too_many_requests(self, retry_after):
+        """Reply that the client should retry after a number of seconds"""
+        self.set_status(429)
+        self.set_header('Retry-After', str(retry_after))
+        self.finish(json.dumps(dict(
+            status='error',
+            message='Too many requests, retry after %s seconds' % retry_after,
+        )))
 
     @web.authenticated
     @gen.coroutine
     def get(self):
         """GET query returns info on all installed extensions"""
         if self.get_argument('refresh', False) == '1':
-            yield self.manager.refresh_outdated()
+            retry_after = self.limits.refreshes.acquire(str(self.current_user))
+            if retry_after:
+                self._too_many_requests(retry_after)
+                return
+            # Do not wait, the client fetches outdated info separately
+            self.manager.refresh_outdated()
         extensions = yield self.manager.list_extensions()
         self.finish(json.dumps(extensions))
 
@@ -289,23 +121,38 @@ class ExtensionHandler(APIHandler):
                 422, 'Could not process instrution %r with extension name %r' % (
                     cmd, name))
 
+        manager = self.manager
+        if self.limits.saturated():
+            self._too_many_requests(self.limits.saturated_retry_after)
+            return
+        retry_after = self.limits.mutations.acquire(str(self.current_user))
+        if retry_after:
+            self._too_many_requests(retry_after)
+            return
+
         # TODO: Can we trust extension_name? Does it need sanitation?
         #       It comes from an authenticated session, but its name is
         #       ultimately from the NPM repository.
         ret_value = None
+        self.limits.pending += 1
         try:
             if cmd == 'install':
-                ret_value = yield self.manager.install(name)
+                ret_value = yield manager.install(name)
             elif cmd == 'uninstall':
-                ret_value = yield self.manager.uninstall(name)
+                ret_value = yield manager.uninstall(name)
             elif cmd == 'enable':
-                ret_value = yield self.manager.enable(name)
+                ret_value = yield manager.enable(name)
             elif cmd == 'disable':
-                ret_value = yield self.manager.disable(name)
+                ret_value = yield manager.disable(name)
         except gen.Return as e:
             ret_value = e.value
         except Exception as e:
             raise web.HTTPError(500, str(e))
+        finally:
+            self.limits.pending -= 1
+
+        # Let all clients know about the changes
+        IOLoop.current().spawn_callback(manager.publish_changes)
 
         if ret_value is None:
             self.set_status(200)
@@ -313,5 +160,177 @@ class ExtensionHandler(APIHandler):
             self.finish(json.dumps(ret_value))
 
 
+class OutdatedHandler(ManagerMixin, APIHandler):
+
+    @web.authenticated
+    @gen.coroutine
+    def get(self):
+        """GET query returns the latest compatible versions of installed extensions
+
+        Waits for any running check for outdated extensions to complete.
+        Extensions that are not in the reply are at their latest version.
+        """
+        outdated = yield self.manager.get_outdated()
+        self.finish(json.dumps(outdated))
+
+
+class BuildHandler(ManagerMixin, APIHandler):
+
+    @web.authenticated
+    def get(self):
+        """GET query returns the state of the build scheduler"""
+        self.finish(json.dumps(self.manager.get_build_status()))
+
+    @web.authenticated
+    @gen.coroutine
+    def post(self):
+        """POST query requests a build, and replies when it is done
+
+        Build requests made in short succession share a single build.
+        """
+        ret_value = yield self.manager.schedule_build()
+        # Let all clients know about the changes
+        IOLoop.current().spawn_callback(self.manager.publish_changes)
+        self.finish(json.dumps(ret_value))
+
+
+class CompatibilityHandler(ManagerMixin, APIHandler):
+
+    # The maximal number of packages to check in one request:
+    max_names = 250
+
+    @web.authenticated
+    @gen.coroutine
+    def post(self):
+        """POST query returns the compatibility of a list of packages with lab"""
+        data = self.get_json_body() or {}
+        names = data.get('names', None)
+        if not isinstance(names, list) or len(names) > self.max_names:
+            raise web.HTTPError(
+                422, 'Expected a list of at most %d package names' % self.max_names)
+        if not all(isinstance(name, string_types) for name in names):
+            raise web.HTTPError(400, 'Package names must be strings')
+        compatibility = yield self.manager.check_compatibility(names)
+        self.finish(json.dumps(compatibility))
+
+
+class CompanionsHandler(ManagerMixin, APIHandler):
+
+    @web.authenticated
+    @gen.coroutine
+    def get(self):
+        """GET query returns the discovery metadata of a package in offline mode
+
+        The package is given by the `name` argument, and optionally the
+        `version` argument. Outside of offline mode, the reply only has
+        `offline` set to false.
+        """
+        name = self.get_argument('name')
+        version = self.get_argument('version', None)
+        companions = yield self.manager.get_companions(name, version)
+        self.finish(json.dumps(companions))
+
+
+class ProfileHandler(ManagerMixin, APIHandler):
+
+    def initialize(self, manager, enabled):
+        super(ProfileHandler, self).initialize(manager)
+        self.enabled = enabled
+
+    @web.authenticated
+    @gen.coroutine
+    def get(self):
+        """GET query profiles a listing of the installed extensions
+
+        With `outdated=1`, a check for outdated extensions is profiled
+        as well. Returns the wall time of each stage, and a summary of
+        the profile, or with `format=pstats`, the profile as a pstats
+        file.
+        """
+        if not self.enabled:
+            raise web.HTTPError(404)
+        from .profiling import ProfilerBusy
+        outdated = self.get_argument('outdated', '0') == '1'
+        summary = StringIO()
+        try:
+            stats, stages = yield self.manager.profile(outdated, summary)
+        except ProfilerBusy as e:
+            raise web.HTTPError(409, str(e))
+        if self.get_argument('format', None) == 'pstats':
+            self.set_header('Content-Type', 'application/octet-stream')
+            self.set_header(
+                'Content-Disposition', 'attachment; filename="discovery.pstats"')
+            self.set_header('X-Discovery-Stages', json.dumps(stages))
+            self.finish(marshal.dumps(stats.stats))
+            return
+        stats.sort_stats('cumulative').print_stats(40)
+        self.finish(json.dumps(dict(stages=stages, summary=summary.getvalue())))
+
+
+class EventsHandler(ManagerMixin, WebSocketMixin, IPythonHandler, websocket.WebSocketHandler):
+    """Websocket handler that pushes change events to the client"""
+
+    def get(self, *args, **kwargs):
+        # Authenticate the request before opening the websocket
+        if not self.get_current_user():
+            raise web.HTTPError(403)
+        return super(EventsHandler, self).get(*args, **kwargs)
+
+    def open(self, *args, **kwargs):
+        super(EventsHandler, self).open(*args, **kwargs)
+        self.manager.subscribe(self.send_event)
+
+    def on_close(self):
+        self.manager.unsubscribe(self.send_event)
+
+    def on_message(self, message):
+        """Messages from the client are ignored"""
+        pass
+
+    def send_event(self, event):
+        """Send an event from the manager to the client"""
+        self.write_message(json.dumps(event))
+
+
+class RollbackHandler(ManagerMixin, APIHandler):
+
+    @web.authenticated
+    def get(self):
+        """GET query returns the app dir snapshots that can be restored"""
+        self.finish(json.dumps(self.manager.list_snapshots()))
+
+    @web.authenticated
+    @gen.coroutine
+    def post(self):
+        """POST query restores a snapshot, by default the most recent one"""
+        data = self.get_json_body() or {}
+        ret_value = yield self.manager.restore(data.get('id', None))
+        if ret_value['status'] == 'ok':
+            # Let all clients know about the changes
+            IOLoop.current().spawn_callback(self.manager.publish_changes)
+        self.finish(json.dumps(ret_value))
+
+
 # The path for lab extensions handler.
 extensions_handler_path = r"/discovery/api/extensions"
+
+# The path for the outdated extensions handler.
+outdated_handler_path = r"/discovery/api/outdated"
+
+# The path for the build handler.
+build_handler_path = r"/discovery/api/build"
+
+# The path for the compatibility handler.
+compatibility_handler_path = r"/discovery/api/compatibility"
+
+# The path for the companions handler.
+companions_handler_path = r"/discovery/api/companions"
+
+# The path for the profiling handler.
+profile_handler_path = r"/discovery/api/profile"
+
+# The path for the rollback handler.
+rollback_handler_path = r"/discovery/api/rollback"
+
+# The path for the events websocket handler.
+events_handler_path = r"/discovery/api/events"
@@ -0,0 +1,205 @@
+"""Resource limits for the subprocesses launched by the extension."""
+
+# Copyright (c) Simula Research.
+# Distributed under the terms of the Modified BSD License.
+
+import os
+import subprocess
+import threading
+import time
+
+from jupyterlab.commands import _AppHandler
+from jupyterlab.jlpmapp import which
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+pjoin = os.path.join
+
+
+def _which(command):
+    """Find a command, returning None if it is not available"""
+    try:
+        return which(command)
+    except ValueError:
+        return None
+
+
+# Whether `systemd-run --user --scope` works, by path of systemd-run:
+_scope_usable = {}
+
+# The number of seconds to wait for the probe of systemd-run:
+_SCOPE_PROBE_TIMEOUT = 10
+
+
+def _can_run_scope(systemd_run, logger):
+    """Check once whether transient user scopes can be created
+
+    This needs a user systemd manager reachable over DBus, which servers
+    started by e.g. JupyterHub spawners often do not have.
+    """
+    if systemd_run not in _scope_usable:
+        with open(os.devnull, 'w') as devnull:
+            try:
+                proc = subprocess.Popen(
+                    [systemd_run, '--user', '--scope', '--quiet', 'true'],
+                    stdin=devnull, stdout=devnull, stderr=devnull)
+            except OSError:
+                proc = None
+        deadline = time.time() + _SCOPE_PROBE_TIMEOUT
+        while proc is not None and proc.poll() is None and time.time() < deadline:
+            time.sleep(0.1)
+        if proc is not None and proc.returncode is None:
+            proc.kill()
+            proc.wait()
+        usable = proc is not None and proc.returncode == 0
+        if not usable:
+            logger.warning(
+                'Could not create a user scope with systemd-run, '
+                'running subprocesses without memory and CPU limits')
+        _scope_usable[systemd_run] = usable
+    return _scope_usable[systemd_run]
+
+
+def command_prefix(config, logger):
+    """Get the command prefix that applies the configured resource limits"""
+    prefix = []
+    if (config.memory_limit or config.cpu_quota) and \
+            os.path.exists('/sys/fs/cgroup/cgroup.controllers') and \
+            _which('systemd-run') and _can_run_scope(_which('systemd-run'), logger):
+        # A transient scope under cgroup v2
+        prefix += [_which('systemd-run'), '--user', '--scope', '--quiet']
+        if config.memory_limit:
+            prefix += ['-p', 'MemoryMax=%s' % config.memory_limit]
+        if config.cpu_quota:
+            prefix += ['-p', 'CPUQuota=%s' % config.cpu_quota]
+    elif config.memory_limit or config.cpu_quota:
+        logger.debug('cgroup v2 limits are not available, ignoring them')
+    if config.nice_level and _which('nice'):
+        prefix += [_which('nice'), '-n', str(config.nice_level)]
+    if config.ionice_class and _which('ionice'):
+        prefix += [_which('ionice'), '-c', str(config.ionice_class)]
+        if config.ionice_class == 2:
+            prefix += ['-n', str(config.ionice_level)]
+    return prefix
+
+
+class BuildSlots(object):
+    """Limits the number of concurrent builds.
+
+    If a directory is given, the limit holds for all servers sharing it,
+    using lock files. Otherwise it only holds within this process. The
+    lock files only need to be readable by all servers. If they cannot
+    be created or opened, the limit only holds within this process.
+    """
+
+    def __init__(self, max_builds, directory=None, logger=None):
+        if max_builds < 1:
+            raise ValueError(
+                'The number of concurrent builds must be at least 1, got %r' % max_builds)
+        self.max_builds = max_builds
+        self.directory = directory if fcntl is not None else None
+        self.log = logger
+        self._semaphore = threading.BoundedSemaphore(max_builds)
+
+    def acquire(self):
+        """Wait for a free slot, returning a handle for `release`"""
+        self._semaphore.acquire()
+        if not self.directory:
+            return None
+        try:
+            return self._acquire_lock()
+        except (IOError, OSError) as e:
+            if self.log is not None:
+                self.log.warning(
+                    'Could not use the build slots in %s, only limiting '
+                    'builds of this server: %s', self.directory, e)
+            return None
+        except BaseException:
+            self._semaphore.release()
+            raise
+
+    def _acquire_lock(self):
+        """Wait for a free lock file in the shared directory"""
+        if not os.path.exists(self.directory):
+            os.makedirs(self.directory)
+        while True:
+            for i in range(self.max_builds):
+                path = pjoin(self.directory, 'build-slot-%d.lock' % i)
+                # Locking does not need write access to the file:
+                fid = os.fdopen(os.open(path, os.O_RDONLY | os.O_CREAT, 0o644), 'r')
+                try:
+                    fcntl.flock(fid, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except (IOError, OSError):
+                    fid.close()
+                    continue
+                return fid
+            time.sleep(1)
+
+    def release(self, handle):
+        if handle is not None:
+            fcntl.flock(handle, fcntl.LOCK_UN)
+            handle.close()
+        self._semaphore.release()
+
+
+class IsolatedAppHandler(_AppHandler):
+    """An app handler that runs its subprocesses with resource limits.
+
+    The commands are prefixed with nice/ionice and, where cgroup v2 is
+    available, systemd-run with memory and CPU limits. Builds wait for
+    a free build slot. The resource usage of each command is logged.
+
+    Unlike in lab, a build raises a RuntimeError if any of its commands
+    fails.
+    """
+
+    def __init__(self, app_dir, logger, config, slots=None, kill_event=None):
+        super(IsolatedAppHandler, self).__init__(app_dir, logger, kill_event=kill_event)
+        self._prefix = command_prefix(config, logger)
+        self._slots = slots
+        # The commands that exited with a non-zero code, and their codes:
+        self._failures = []
+
+    def build(self, *args, **kwargs):
+        handle = None
+        if self._slots is not None:
+            self.logger.debug('Waiting for a free build slot')
+            handle = self._slots.acquire()
+        try:
+            del self._failures[:]
+            super(IsolatedAppHandler, self).build(*args, **kwargs)
+        finally:
+            if self._slots is not None:
+                self._slots.release(handle)
+        if self._failures:
+            raise RuntimeError('JupyterLab failed to build: %s' % ', '.join(
+                '%s exited with %d' % (' '.join(cmd), ret)
+                for cmd, ret in self._failures))
+
+    def _run(self, cmd, **kwargs):
+        start = time.time()
+        before = resource and resource.getrusage(resource.RUSAGE_CHILDREN)
+        try:
+            ret = super(IsolatedAppHandler, self)._run(self._prefix + cmd, **kwargs)
+            if ret:
+                self._failures.append((cmd, ret))
+            return ret
+        finally:
+            if resource is not None:
+                # Concurrent commands are counted together
+                after = resource.getrusage(resource.RUSAGE_CHILDREN)
+                self.logger.info(
+                    'Ran %s in %.1fs (user %.1fs, system %.1fs, peak child RSS %d kB)',
+                    os.path.basename(cmd[0]), time.time() - start,
+                    after.ru_utime - before.ru_utime,
+                    after.ru_stime - before.ru_stime,
+                    after.ru_maxrss)
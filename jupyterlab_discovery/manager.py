@@ -0,0 +1,817 @@
+"""Management of the extensions in a lab app dir."""
+
+# Copyright (c) Simula Research.
+# Distributed under the terms of the Modified BSD License.
+
+import os
+
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from threading import Event
+
+from ipython_genutils.tempdir import TemporaryDirectory
+from tornado import gen
+from tornado.ioloop import IOLoop
+from tornado.concurrent import Future, run_on_executor
+
+from jupyterlab.jlpmapp import which
+from jupyterlab.commands import (
+    get_app_info, uninstall_extension,
+    enable_extension, disable_extension,
+    _AppHandler, _read_package, _semver_key,
+    _validate_compatibility, _validate_extension
+)
+
+from .buildcache import BuildCache
+from .buildstate import BuildState
+from .cache import MetadataCache, PackageCache, SharedCache
+from .compatdb import CompatDatabase
+from .config import DiscoveryConfig
+from .isolation import BuildSlots, IsolatedAppHandler, command_prefix
+from .processes import ProcessKilled, ProcessRunner
+from .profiling import profile_manager
+from .registry import RegistryPool
+from .rollback import RollbackSnapshots
+from .scheduler import BuildScheduler
+from .snapshot import ListingSnapshot
+from .tarballs import TarballStore
+
+try:
+    from urllib.error import URLError
+except ImportError:
+    from urllib2 import URLError
+
+
+def _make_extension_entry(name, description, enabled, core, latest_version,
+                          installed_version, status, installed=None,
+                          latest_version_pending=False):
+    """Create an extension entry that can be sent to the client"""
+    ret = dict(
+        name=name,
+        description=description,
+        enabled=enabled,
+        core=core,
+        latest_version=latest_version,
+        installed_version=installed_version,
+        status=status,
+    )
+    if installed is not None:
+        ret['installed'] = installed
+    if latest_version_pending:
+        ret['latest_version_pending'] = True
+    return ret
+
+
+def _ensure_compat_errors(info, app_dir, logger):
+    """Ensure that the app info has compat_errors field"""
+    handler = _AppHandler(app_dir, logger)
+    info['compat_errors'] = handler._get_extension_compat()
+
+
+def _latest_compatible_version(name, metadata, core_data):
+    """Get the latest version of a package that is compatible with lab
+
+    Returns None if no version is compatible.
+    """
+    # Sort pre-release first, as we will reverse the sort:
+    def sort_key(key_value):
+        return _semver_key(key_value[0], prerelease_first=True)
+
+    for version, data in sorted(metadata['versions'].items(),
+                                key=sort_key,
+                                reverse=True):
+        deps = data.get('dependencies', {})
+        errors = _validate_compatibility(name, deps, core_data)
+        if not errors:
+            # Found a compatible version
+            return version
+    return None
+
+
+def _describe_incompatibility(name, metadata, core_data):
+    """Describe why the newest version of a package is incompatible with lab"""
+    version = max(metadata['versions'],
+                  key=lambda v: _semver_key(v, prerelease_first=True))
+    deps = metadata['versions'][version].get('dependencies', {})
+    errors = _validate_compatibility(name, deps, core_data)
+    return '%s@%s requires %s' % (name, version, ', '.join(
+        '%s@%s (lab has %s)' % (dep, ext_range, core_range)
+        for dep, core_range, ext_range in errors))
+
+
+def _pack_name(name, version):
+    """Get the file name `npm pack` gives the tarball of a package version"""
+    key = '%s@%s' % (name, version)
+    return key[0].replace('@', '') + key[1:].replace('@', '-').replace('/', '-') + '.tgz'
+
+
+# The number of packages to download in each `npm pack` call:
+_PACK_CHUNK_SIZE = 10
+
+
+class SharedResources(object):
+    """The caches and pools shared by the managers of all app dirs
+
+    None of these depend on the app dir: package data is keyed by path,
+    and registry data by package name.
+    """
+
+    def __init__(self, log, config):
+        # Package data read from disk, shared by all lookups:
+        self.packages = PackageCache(config.package_cache_size)
+        # Registry data shared by all servers on the node, if configured:
+        self.shared_cache = None
+        if config.shared_cache_dir:
+            self.shared_cache = SharedCache(
+                config.shared_cache_dir, config.shared_cache_ttl, log)
+        # The prebuilt compatibility database, used in offline mode:
+        self.compat_db = None
+        if config.compat_database:
+            self.compat_db = CompatDatabase(config.compat_database)
+        # Reduced packuments, keyed by package name:
+        self.metadata = MetadataCache(config.metadata_cache_size)
+        # Runs compatibility checks, apart from the executor of the managers:
+        self.compat_checks = ThreadPoolExecutor(
+            max_workers=config.compat_check_workers)
+        # The pool of registries, created on first use:
+        self.registries = None
+        self.build_slots = BuildSlots(
+            config.max_concurrent_builds, config.shared_cache_dir or None, log)
+        # Runs the npm commands that do not need an executor thread:
+        self.processes = ProcessRunner(
+            log, config.max_subprocesses, command_prefix(config, log))
+
+
+class ExtensionManager(object):
+    executor = ThreadPoolExecutor(max_workers=5)
+
+    def __init__(self, log, app_dir, config=None, resources=None,
+                 use_snapshot=True):
+        self.log = log
+        self.app_dir = app_dir
+        self.config = config or DiscoveryConfig()
+        if resources is None:
+            resources = SharedResources(log, self.config)
+        self._resources = resources
+        self._packages = resources.packages
+        self._shared = resources.shared_cache
+        self._compat_db = resources.compat_db
+        self._metadata = resources.metadata
+        self._compat_checks = resources.compat_checks
+        self._processes = resources.processes
+        self._build_state = BuildState(app_dir, log, self._packages)
+        # Validated tarballs, reused by installs:
+        self._tarballs = TarballStore(
+            os.path.join(app_dir, 'discovery', 'tarballs'), log,
+            self.config.tarball_store_size)
+        # Snapshots of the app dir, taken before each mutation:
+        self._rollback = RollbackSnapshots(
+            app_dir, log, self.config.max_rollback_snapshots)
+        # Earlier builds, restored when the same extensions are built again:
+        self._build_cache = BuildCache(app_dir, log, self.config.build_cache_size)
+        self._builds = BuildScheduler(
+            self._build, self.config.build_delay, self.config.build_max_delay)
+        self._outdated = None
+        self._outdated_cancel = None
+        # The last listing, keyed by extension name, and its subscribers:
+        self._listing = None
+        self._subscribers = []
+        # A listing from the snapshot, served until it has been revalidated:
+        self._snapshot = ListingSnapshot(
+            app_dir, log, self.config.snapshot_max_age)
+        self._warm_listing = None
+        self._warm_fingerprint = None
+        snapshot = self._snapshot.load() if use_snapshot else None
+        if snapshot is not None:
+            self._warm_listing = snapshot['listing']
+            self._warm_fingerprint = snapshot['fingerprint']
+            self._listing = dict((e['name'], e) for e in snapshot['listing'])
+            self._outdated = Future()
+            self._outdated.set_result(snapshot['outdated'])
+            IOLoop.current().spawn_callback(self._revalidate)
+        else:
+            # Start fetching data on outdated extensions immediately
+            IOLoop.current().spawn_callback(self._get_outdated)
+
+    @gen.coroutine
+    def list_extensions(self):
+        """Handle a request for all installed extensions"""
+        fingerprint = self._snapshot.fingerprint()
+        if self._warm_listing is not None:
+            if fingerprint == self._warm_fingerprint:
+                raise gen.Return(self._warm_listing)
+            # The app dir changed since the snapshot was taken:
+            self._warm_listing = None
+        info = get_app_info(app_dir=self.app_dir, logger=self.log)
+        build_check_info = self._build_state.check(info)
+        _ensure_compat_errors(info, self.app_dir, self.log)
+        extensions = []
+        # TODO: Ensure loops can run in parallel
+        for name, data in info['extensions'].items():
+            status = 'ok'
+            pkg_info = yield self._get_pkg_info(name, data)
+            if info['compat_errors'].get(name, None):
+                status = 'error'
+            else:
+                for packages in build_check_info.values():
+                    if name in packages:
+                        status = 'warning'
+            extensions.append(_make_extension_entry(
+                name=name,
+                description=pkg_info['description'],
+                enabled=(name not in info['disabled']),
+                core=False,
+                # Use wanted version to ensure we limit ourselves
+                # within semver restrictions
+                latest_version=pkg_info['latest_version'],
+                latest_version_pending=pkg_info['latest_version_pending'],
+                installed_version=data['version'],
+                status=status,
+            ))
+        for name in build_check_info['uninstall']:
+            data = yield self._get_scheduled_uninstall_info(name)
+            extensions.append(_make_extension_entry(
+                name=name,
+                description=data['description'],
+                installed=False,
+                enabled=False,
+                core=False,
+                latest_version=data['version'],
+                installed_version=data['version'],
+                status='warning',
+            ))
+        self._publish_listing(extensions)
+        outdated = self._get_outdated()
+        if outdated.done() and not outdated.exception():
+            self._snapshot.save(fingerprint, extensions, outdated.result())
+        raise gen.Return(extensions)
+
+    @gen.coroutine
+    def _revalidate(self):
+        """Recompute the data that was loaded from the snapshot
+
+        Subscribers are notified of any differences from the snapshot.
+        """
+        snapshot_outdated = self._outdated
+        try:
+            outdated = self._load_outdated()
+            yield outdated
+            if self._outdated is snapshot_outdated:
+                self._outdated = outdated
+        finally:
+            warm = self._warm_listing is not None
+            self._warm_listing = None
+        if warm:
+            yield self.publish_changes()
+
+    def subscribe(self, callback):
+        """Subscribe to change events.
+
+        The callback is called with a dict describing each event.
+        Events of type 'extensions' carry the entries that changed, and
+        the names of the entries that were removed since the last listing.
+        Events of type 'outdated' carry the result of a completed check
+        for outdated extensions.
+        """
+        self._subscribers.append(callback)
+
+    def unsubscribe(self, callback):
+        """Remove a callback added by `subscribe`"""
+        if callback in self._subscribers:
+            self._subscribers.remove(callback)
+
+    @gen.coroutine
+    def publish_changes(self):
+        """Recompute the listing, and send any changes to the subscribers"""
+        self._warm_listing = None
+        yield self.list_extensions()
+
+    def _publish(self, event):
+        """Send an event to all subscribers"""
+        for callback in list(self._subscribers):
+            try:
+                callback(event)
+            except Exception:
+                self.log.exception('Failed to send discovery event')
+
+    def _publish_listing(self, extensions):
+        """Send the difference from the previous listing to the subscribers"""
+        listing = dict((entry['name'], entry) for entry in extensions)
+        previous = self._listing
+        self._listing = listing
+        if previous is None:
+            return
+        changed = [entry for name, entry in listing.items()
+                   if previous.get(name, None) != entry]
+        removed = [name for name in previous if name not in listing]
+        if changed or removed:
+            self._publish(dict(type='extensions', changed=changed, removed=removed))
+
+    @gen.coroutine
+    def install(self, extension):
+        """Handle an install/update request
+
+        If the version to install is known, its tarball is downloaded
+        on the IOLoop first, so that the executor thread running the
+        install does not have to wait for the registry.
+        """
+        self._warm_listing = None
+        source, version = yield self.executor.submit(self._get_install_source, extension)
+        if source == extension and version is not None and not self.config.offline:
+            source = (yield self._download(extension, version)) or extension
+        ret_value = yield self._install(extension, source)
+        raise gen.Return(ret_value)
+
+    @run_on_executor
+    def _install(self, extension, source):
+        """Install an extension from a source"""
+        self._rollback.take('install %s' % extension)
+        try:
+            self._app_handler().install_extension(source)
+        except ValueError as e:
+            return dict(status='error', message=str(e))
+        if source == extension:
+            self._store_installed(extension)
+        return dict(status='ok',)
+
+    @gen.coroutine
+    def _download(self, name, version):
+        """Download the tarball of a package version into the store
+
+        Returns the path of the stored tarball, or None on failure.
+        """
+        metadata = self._metadata.get(name, None) or {}
+        if version not in metadata.get('versions', {}):
+            # Only download versions known from the registry
+            raise gen.Return(None)
+        dist = metadata['versions'][version].get('dist', {})
+        with TemporaryDirectory() as tempdir:
+            try:
+                ret, _ = yield self._processes.run(
+                    [which('npm'), 'pack', '%s@%s' % (name, version)], cwd=tempdir,
+                    timeout=self.config.subprocess_timeout)
+            except ProcessKilled as e:
+                self.log.warning('Could not download %s@%s: %s', name, version, e)
+                raise gen.Return(None)
+            if ret != 0:
+                raise gen.Return(None)
+            path = yield self.executor.submit(
+                self._tarballs.add, os.path.join(tempdir, _pack_name(name, version)),
+                name, version, dist.get('shasum', None))
+        raise gen.Return(path)
+
+    def _app_handler(self, kill_event=None):
+        """Get an app handler that runs its subprocesses with resource limits"""
+        return IsolatedAppHandler(
+            self.app_dir, self.log, self.config, self._resources.build_slots,
+            kill_event=kill_event)
+
+    def _get_install_source(self, extension):
+        """Get what to pass to `install_extension` for an extension.
+
+        If the latest compatible version of the extension is known from
+        cached data, and its tarball is in the store, the path of the
+        tarball is returned. Otherwise, the extension is returned as is.
+        The latest compatible version, if known, is returned as well.
+        """
+        if os.path.exists(extension):
+            return extension, None
+        version = None
+        if self._outdated is not None and self._outdated.done() and \
+                not self._outdated.exception():
+            version = self._outdated.result().get(extension, None)
+        metadata = self._metadata.get(extension, None)
+        if version is None and metadata is not None:
+            core_data = _AppHandler(self.app_dir, self.log).info['core_data']
+            version = _latest_compatible_version(extension, metadata, core_data)
+        path = version and self._tarballs.get(extension, version)
+        if path:
+            self.log.info('Installing %s@%s from the local store', extension, version)
+            return path, version
+        return extension, version
+
+    def _store_installed(self, name):
+        """Add the tarball of a newly installed extension to the store"""
+        info = get_app_info(app_dir=self.app_dir, logger=self.log)
+        data = info['extensions'].get(name, None)
+        if data and os.path.isfile(data['path']):
+            self._tarballs.add(data['path'], name, data['version'])
+
+    @run_on_executor
+    def uninstall(self, extension):
+        """Handle an uninstall request"""
+        self._warm_listing = None
+        self._rollback.take('uninstall %s' % extension)
+        did_uninstall = uninstall_extension(extension, app_dir=self.app_dir, logger=self.log)
+        raise gen.Return(dict(status='ok' if did_uninstall else 'error',))
+
+    @run_on_executor
+    def enable(self, extension):
+        """Handle an enable request"""
+        self._warm_listing = None
+        self._rollback.take('enable %s' % extension)
+        enable_extension(extension, app_dir=self.app_dir, logger=self.log)
+        raise gen.Return(dict(status='ok',))
+
+    @run_on_executor
+    def disable(self, extension):
+        """Handle a disable request"""
+        self._warm_listing = None
+        self._rollback.take('disable %s' % extension)
+        disable_extension(extension, app_dir=self.app_dir, logger=self.log)
+        raise gen.Return(dict(status='ok',))
+
+    @gen.coroutine
+    def schedule_build(self):
+        """Handle a build request
+
+        The build is shared with all other requests made before it starts.
+        """
+        try:
+            yield self._builds.request()
+        except Exception as e:
+            self.log.warning('Build of app dir failed: %s', e)
+            raise gen.Return(dict(status='error', message=str(e)))
+        raise gen.Return(dict(status='ok'))
+
+    def get_build_status(self):
+        """Handle a request for the state of the build scheduler"""
+        return dict(status=self._builds.status)
+
+    @run_on_executor
+    def _build(self):
+        """Build the app dir, or restore an earlier build of the same extensions
+
+        Raises RuntimeError if the build fails, in which case nothing is cached.
+        """
+        self._warm_listing = None
+        info = get_app_info(app_dir=self.app_dir, logger=self.log)
+        key = self._build_cache.key(info)
+        if key is not None and self._build_cache.restore(key):
+            return
+        self._app_handler().build()
+        # Only cache the build if the extensions did not change meanwhile:
+        info = get_app_info(app_dir=self.app_dir, logger=self.log)
+        if key is not None and self._build_cache.key(info) == key:
+            self._build_cache.store(key)
+
+    def profile(self, outdated=False, stream=None):
+        """Handle a request to profile the listing of installed extensions"""
+        return profile_manager(self, outdated, stream)
+
+    def list_snapshots(self):
+        """Handle a request for the app dir snapshots that can be restored"""
+        return self._rollback.list()
+
+    @run_on_executor
+    def restore(self, snapshot_id=None):
+        """Handle a request to restore an app dir snapshot"""
+        self._warm_listing = None
+        try:
+            meta = self._rollback.restore(snapshot_id)
+        except (ValueError, IOError, OSError) as e:
+            return dict(status='error', message=str(e))
+        return dict(status='ok', snapshot=meta)
+
+    @gen.coroutine
+    def check_compatibility(self, names):
+        """Handle a request for the compatibility of packages with lab
+
+        For each package, returns the latest version that is compatible,
+        or why the newest version is not. As for installs, only the
+        dependencies of each version are checked. Packages that have not
+        been checked within the configured time are reported as unknown.
+        """
+        handler = yield self.executor.submit(_AppHandler, self.app_dir, self.log)
+        futures = [
+            self._compat_checks.submit(self._check_compatibility, handler, name)
+            for name in names
+        ]
+        deadline = IOLoop.current().time() + self.config.compat_check_timeout
+        results = {}
+        for name, future in zip(names, futures):
+            try:
+                if future.done():
+                    results[name] = future.result()
+                else:
+                    results[name] = yield gen.with_timeout(deadline, future)
+            except gen.TimeoutError:
+                future.cancel()
+                results[name] = dict(
+                    status='unknown', message='Timed out checking compatibility')
+            except Exception as e:
+                self.log.warning('Failed to check the compatibility of %s: %r', name, e)
+                results[name] = dict(status='unknown', message=str(e))
+        raise gen.Return(results)
+
+    def _check_compatibility(self, handler, name):
+        """Check the compatibility of a package with lab"""
+        core_data = handler.info['core_data']
+        try:
+            metadata = self._get_package_metadata(handler, name)
+        except URLError as e:
+            return dict(status='unknown', message=str(e))
+        if not metadata or not metadata['versions']:
+            return dict(status='unknown', message='Package metadata not available')
+        if self._shared is not None:
+            hit, version = self._shared.get_compatible(
+                name, core_data['jupyterlab']['version'])
+            # Only trust versions that the package actually has:
+            if hit and version in metadata['versions']:
+                return dict(status='compatible', latest_version=version)
+        version = _latest_compatible_version(name, metadata, core_data)
+        if version is not None:
+            return dict(status='compatible', latest_version=version)
+        return dict(
+            status='incompatible',
+            message=_describe_incompatibility(name, metadata, core_data),
+        )
+
+    @run_on_executor
+    def get_companions(self, name, version=None):
+        """Handle a request for the discovery metadata of a package version
+
+        Only available in offline mode, where the metadata is read from the
+        compatibility database. Otherwise, the client should read it from
+        the registry. If no version is given, the newest version is used.
+        """
+        if not self.config.offline:
+            return dict(offline=False)
+        discovery = None
+        if self._compat_db is not None:
+            if version is None:
+                metadata = self._compat_db.get_metadata(name)
+                if metadata:
+                    version = max(metadata['versions'],
+                                  key=lambda v: _semver_key(v, prerelease_first=True))
+            if version is not None:
+                discovery = self._compat_db.get_discovery(name, version)
+        return dict(offline=True, discovery=discovery)
+
+    @gen.coroutine
+    def get_outdated(self):
+        """Handle a request for the latest compatible versions of installed extensions"""
+        try:
+            outdated = yield self._get_outdated()
+        except Exception as e:
+            self.log.warning('Failed to check for outdated extensions: %s', e)
+            outdated = {}
+        raise gen.Return(outdated)
+
+    @gen.coroutine
+    def get_report(self, refresh=False):
+        """Get the full listing, once the check for outdated extensions is done
+
+        If refresh is true, a new check is started, bypassing all caches.
+        """
+        if refresh:
+            self.refresh_outdated()
+        outdated = yield self.get_outdated()
+        extensions = yield self.list_extensions()
+        raise gen.Return(dict(
+            app_dir=self.app_dir,
+            extensions=extensions,
+            outdated=outdated,
+        ))
+
+    @gen.coroutine
+    def _get_pkg_info(self, name, data):
+        """Get information about a package
+
+        This does not wait for the check for outdated extensions. If it
+        has not completed, the latest version is left for the client to
+        fetch later, and marked as pending.
+        """
+        info = self._packages.read_package(data['path'])
+        info['latest_version_pending'] = False
+
+        # Get latest version that is compatible with current lab:
+        future = self._get_outdated()
+        if not future.done():
+            info['latest_version'] = None
+            info['latest_version_pending'] = True
+            raise gen.Return(info)
+        outdated = None if future.exception() else future.result()
+        if outdated and name in outdated:
+            info['latest_version'] = outdated[name]
+        else:
+            # Fallback to indicating that current is latest
+            info['latest_version'] = info['version']
+
+        raise gen.Return(info)
+
+    def _get_outdated(self):
+        """Get a Future to information from `npm/yarn outdated`.
+
+        This will cache the results. To refresh the cache, set
+        self._outdated to None before calling. To bypass the cache,
+        call self._load_outdated directly.
+        """
+        # Ensure self._outdated is a Future for data on outdated extensions
+        if self._outdated is None:
+            self._outdated = self._load_outdated()
+        # Return the Future
+        return self._outdated
+
+    def refresh_outdated(self):
+        self._warm_listing = None
+        self._outdated = self._load_outdated(refresh=True)
+        return self._outdated
+
+    @gen.coroutine
+    def _load_outdated(self, refresh=False):
+        """Get the latest compatible version
+
+        If refresh is true, the shared cache is bypassed.
+
+        The lookup is aborted when it exceeds the configured deadline, or
+        when a newer lookup is started. In that case, the versions found
+        before the abort are returned.
+        """
+        if self._outdated_cancel is not None:
+            # Cancel any lookup that is still running
+            self._outdated_cancel.set()
+        cancel = self._outdated_cancel = Event()
+        info = get_app_info(app_dir=self.app_dir, logger=self.log)
+        versions = {}
+        future = self._latest_compatible_package_versions(
+            tuple(info['extensions'].keys()),
+            cancel,
+            versions,
+            refresh,
+        )
+        try:
+            yield gen.with_timeout(
+                timedelta(seconds=self.config.outdated_timeout), future)
+        except gen.TimeoutError:
+            self.log.warning(
+                'Check for outdated extensions timed out after %s seconds, '
+                'returning partial results', self.config.outdated_timeout)
+            cancel.set()
+        except Exception as e:
+            self.log.warning(
+                'Check for outdated extensions failed, returning partial results: %s', e)
+            cancel.set()
+        versions = dict(versions)
+        if cancel is self._outdated_cancel:
+            # Only publish the results of the latest check
+            self._publish(dict(type='outdated', outdated=versions))
+        raise gen.Return(versions)
+
+    @gen.coroutine
+    def _latest_compatible_package_versions(self, names, cancel=None, versions=None,
+                                            refresh=False):
+        """Get the latest compatible version of a list of packages.
+
+        This is a variant of similar code in lab app, but optimized
+        for checking several packages in one go.
+
+        The lookup stops early if the `cancel` event is set. Versions are
+        added to the `versions` dict as soon as they are found, so that
+        partial results are available while the lookup is running.
+
+        Results are read from the shared cache, if configured, unless
+        refresh is true. New results are always written to it.
+
+        The metadata lookups run on the executor, while the packages are
+        downloaded by `npm pack` processes waited for on the IOLoop.
+        """
+        if cancel is None:
+            cancel = Event()
+        if versions is None:
+            versions = {}
+        keys, shasums, core_version = yield self.executor.submit(
+            self._find_compatible_versions, names, cancel, versions, refresh)
+
+        if not keys:
+            raise gen.Return(versions)
+        if self.config.offline:
+            # Cannot download the packages, so rely on the dependency check
+            for key in keys:
+                name, version = key.rsplit('@', 1)
+                versions[name] = version
+            raise gen.Return(versions)
+        with TemporaryDirectory() as tempdir:
+            # Pack in chunks, so that an abort keeps the chunks already done
+            for i in range(0, len(keys), _PACK_CHUNK_SIZE):
+                chunk = keys[i:i + _PACK_CHUNK_SIZE]
+                try:
+                    ret, _ = yield self._processes.run(
+                        [which('npm'), 'pack'] + chunk, cwd=tempdir, cancel=cancel,
+                        timeout=self.config.subprocess_timeout)
+                except ProcessKilled as e:
+                    self.log.debug('Stopped check for outdated extensions: %s', e)
+                    break
+                if ret != 0:
+                    # E.g. a private or missing tarball, keep checking the rest
+                    self.log.warning(
+                        'Could not download %s, skipping them', ', '.join(chunk))
+                    continue
+                yield self.executor.submit(
+                    self._validate_packed, tempdir, chunk, shasums, core_version, versions)
+        raise gen.Return(versions)
+
+    def _find_compatible_versions(self, names, cancel, versions, refresh):
+        """Find the latest compatible versions of packages from their metadata
+
+        Versions known from the shared cache are added to `versions`.
+        Returns the 'name@version' keys of the other packages to check,
+        the shasums of their tarballs, and the lab version.
+        """
+        handler = self._app_handler(kill_event=cancel)
+        core_data = handler.info['core_data']
+        core_version = core_data['jupyterlab']['version']
+        shared = self._shared
+
+        keys = []
+        shasums = {}
+        for name in names:
+            if cancel.is_set():
+                break
+            try:
+                metadata = self._get_package_metadata(handler, name, refresh)
+            except URLError:
+                continue
+            if metadata is None:
+                # Not in the compatibility database
+                continue
+            if shared is not None and not refresh:
+                hit, version = shared.get_compatible(name, core_version)
+                # Only trust versions that the package actually has:
+                if hit and (version is None or version in metadata['versions']):
+                    if version is not None:
+                        versions[name] = version
+                    continue
+            version = _latest_compatible_version(name, metadata, core_data)
+            if version is not None:
+                keys.append('%s@%s' % (name, version))
+                shasums[name] = metadata['versions'][version].get('dist', {}).get('shasum')
+            elif shared is not None:
+                shared.set_compatible(name, core_version, None)
+        return keys, shasums, core_version
+
+    def _validate_packed(self, tempdir, keys, shasums, core_version, versions):
+        """Validate packed packages, adding the valid versions to `versions`"""
+        shared = self._shared
+        for key in keys:
+            name, version = key.rsplit('@', 1)
+            fname = os.path.join(tempdir, _pack_name(name, version))
+            # Temporary files, which would only evict useful cache entries:
+            data = _read_package(fname)
+            # Verify that the version is a valid extension.
+            valid = not _validate_extension(data)
+            if valid:
+                versions[data['name']] = data['version']
+                # Keep it, in case the user wants to install it
+                self._tarballs.add(
+                    fname, data['name'], data['version'], shasums.get(data['name'], None))
+            if shared is not None:
+                shared.set_compatible(
+                    data['name'], core_version, data['version'] if valid else None)
+
+    def _get_package_metadata(self, handler, name, refresh=False):
+        """Get the reduced packument of a package, using the caches if possible
+
+        If refresh is true, the caches are bypassed, and the metadata in
+        memory is replaced. The metadata of other packages, which may be
+        used by the managers of other app dirs, is kept. In offline mode,
+        the metadata is read from the compatibility database, and None is
+        returned for unknown packages.
+        """
+        if self.config.offline:
+            if self._compat_db is None:
+                return None
+            return self._compat_db.get_metadata(name)
+        metadata = None if refresh else self._metadata.get(name, None)
+        if metadata is None and self._shared is not None and not refresh:
+            metadata = self._shared.get_metadata(name)
+        if metadata is None:
+            metadata = self._get_registries(handler).fetch_package_metadata(name)
+            if self._shared is not None:
+                self._shared.set_metadata(name, metadata)
+        self._metadata[name] = metadata
+        return metadata
+
+    def _get_registries(self, handler):
+        """Get the pool of registries to fetch package metadata from"""
+        resources = self._resources
+        if resources.registries is None:
+            resources.registries = RegistryPool(
+                self.config.registries or [handler.registry],
+                self.log,
+                timeout=self.config.request_timeout,
+                hedge_delay=self.config.hedge_delay,
+                failure_threshold=self.config.failure_threshold,
+                circuit_reset=self.config.circuit_reset,
+            )
+        return resources.registries
+
+    @run_on_executor
+    def _get_scheduled_uninstall_info(self, name):
+        """Get information about a package that is scheduled for uninstallation"""
+        target = os.path.join(
+            self.app_dir, 'staging', 'node_modules', name, 'package.json')
+        if os.path.exists(target):
+            return self._packages.read_json(target)
+        else:
+            return None
@@ -0,0 +1,147 @@
+"""Subprocesses run on the IOLoop, without tying up executor threads."""
+
+# Copyright (c) Simula Research.
+# Distributed under the terms of the Modified BSD License.
+
+from datetime import timedelta
+import os
+import signal
+import subprocess
+import time
+
+from tornado import gen
+from tornado.iostream import StreamClosedError
+from tornado.locks import Semaphore
+from tornado.process import Subprocess
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+# The interval at which running processes are checked for cancellation:
+_POLL_INTERVAL = timedelta(seconds=0.5)
+
+# The number of seconds a killed process is given to terminate:
+_KILL_GRACE = 5
+
+
+class ProcessKilled(Exception):
+    """Raised when a process is killed because of a timeout or cancellation"""
+    pass
+
+
+class ProcessRunner(object):
+    """Runs commands as subprocesses, waiting for them on the IOLoop.
+
+    At most `max_processes` commands run at a time, the rest wait for
+    a free slot. Output is logged line by line as it arrives. On POSIX,
+    each command runs in its own process group, which is cleaned up when
+    the command exits or is killed. The time and resource usage of each
+    command is logged.
+
+    Args:
+        logger: The logger to use.
+        max_processes: The maximal number of concurrent processes.
+        prefix: A prefix for all commands, e.g. to apply resource limits.
+    """
+
+    def __init__(self, logger, max_processes=4, prefix=None):
+        self.log = logger
+        self.prefix = prefix or []
+        self._semaphore = Semaphore(max(max_processes, 1))
+
+    @gen.coroutine
+    def run(self, cmd, cwd=None, timeout=None, cancel=None):
+        """Run a command, returning its exit code and output
+
+        Raises ProcessKilled if the command is still running after
+        `timeout` seconds, or when the `cancel` event is set.
+        """
+        with (yield self._semaphore.acquire()):
+            kwargs = {}
+            if os.name == 'posix':
+                kwargs['preexec_fn'] = os.setsid
+            self.log.debug('> %s', ' '.join(cmd))
+            proc = Subprocess(
+                self.prefix + list(cmd), cwd=cwd, stdin=subprocess.PIPE,
+                stdout=Subprocess.STREAM, stderr=subprocess.STDOUT, **kwargs)
+            proc.stdin.close()
+            start = time.time()
+            before = resource and resource.getrusage(resource.RUSAGE_CHILDREN)
+            output = []
+            reading = self._read_output(proc, output)
+            exited = proc.wait_for_exit(raise_error=False)
+            deadline = None if timeout is None else start + timeout
+            try:
+                while not exited.done():
+                    if cancel is not None and cancel.is_set():
+                        raise ProcessKilled('%s was cancelled' % cmd[0])
+                    if deadline is not None and time.time() > deadline:
+                        raise ProcessKilled('%s timed out after %s seconds' % (cmd[0], timeout))
+                    try:
+                        yield gen.with_timeout(_POLL_INTERVAL, exited)
+                    except gen.TimeoutError:
+                        pass
+            except ProcessKilled:
+                yield self._kill(proc, exited)
+                raise
+            finally:
+                # Clean up any processes left behind in the group
+                self._signal_group(proc, signal.SIGKILL)
+                self._log_usage(cmd, start, before)
+            yield reading
+        raise gen.Return((exited.result(), ''.join(output)))
+
+    def _log_usage(self, cmd, start, before):
+        """Log the time and resource usage of a command"""
+        if resource is None:
+            return
+        # Concurrent commands are counted together
+        after = resource.getrusage(resource.RUSAGE_CHILDREN)
+        self.log.info(
+            'Ran %s in %.1fs (user %.1fs, system %.1fs, peak child RSS %d kB)',
+            os.path.basename(cmd[0]), time.time() - start,
+            after.ru_utime - before.ru_utime,
+            after.ru_stime - before.ru_stime,
+            after.ru_maxrss)
+
+    @gen.coroutine
+    def _read_output(self, proc, output):
+        """Collect the output of a process, logging it as it arrives"""
+        pending = ''
+        while True:
+            try:
+                chunk = yield proc.stdout.read_bytes(65536, partial=True)
+            except StreamClosedError:
+                break
+            lines = (pending + chunk.decode('utf-8', 'replace')).split('\n')
+            pending = lines.pop()
+            for line in lines:
+                self.log.debug(line)
+                output.append(line + '\n')
+        if pending:
+            self.log.debug(pending)
+            output.append(pending)
+
+    @gen.coroutine
+    def _kill(self, proc, exited):
+        """Terminate a process, killing it if it does not exit in time"""
+        self._signal_group(proc, signal.SIGTERM)
+        try:
+            yield gen.with_timeout(timedelta(seconds=_KILL_GRACE), exited)
+        except gen.TimeoutError:
+            self._signal_group(proc, signal.SIGKILL)
+            yield exited
+
+    def _signal_group(self, proc, sig):
+        """Send a signal to the process group of a process, or the process itself"""
+        try:
+            if os.name == 'posix':
+                os.killpg(proc.pid, sig)
+            else:
+                proc.proc.kill()
+        except OSError:
+            # Already gone
+            pass
@@ -0,0 +1,78 @@
+"""Profiling of the extension manager pipeline."""
+
+# Copyright (c) Simula Research.
+# Distributed under the terms of the Modified BSD License.
+
+import cProfile
+import pstats
+from threading import Lock
+import time
+
+from tornado import gen
+
+
+# Only one profile can run at a time, as the IOLoop thread has one profiler:
+_running = Lock()
+
+
+class ProfilerBusy(Exception):
+    """Raised when a profile is requested while another one is running"""
+    pass
+
+
+class ProfilingExecutor(object):
+    """Wraps an executor, profiling each call submitted to it"""
+
+    def __init__(self, executor):
+        self._executor = executor
+        self._lock = Lock()
+        self.profiles = []
+
+    def submit(self, fn, *args, **kwargs):
+        def run():
+            profile = cProfile.Profile()
+            try:
+                return profile.runcall(fn, *args, **kwargs)
+            finally:
+                with self._lock:
+                    self.profiles.append(profile)
+        return self._executor.submit(run)
+
+
+@gen.coroutine
+def profile_manager(manager, outdated=False, stream=None):
+    """Profile a listing of the installed extensions of a manager
+
+    If outdated is true, a check for outdated extensions is run first,
+    using the caches. Both the IOLoop thread and the calls submitted to
+    the executor are profiled. Other requests served meanwhile are
+    included in the profile.
+
+    Returns the combined pstats.Stats, and the wall time of each stage.
+    """
+    if not _running.acquire(False):
+        raise ProfilerBusy('Another profile is already running')
+    executor = ProfilingExecutor(manager.executor)
+    # Shadows the class attribute, so that all executor calls are profiled:
+    manager.executor = executor
+    profile = cProfile.Profile()
+    stages = {}
+    profile.enable()
+    try:
+        if outdated:
+            start = time.time()
+            manager._outdated = manager._load_outdated()
+            yield manager._outdated
+            stages['load_outdated'] = time.time() - start
+        start = time.time()
+        manager._warm_listing = None
+        yield manager.list_extensions()
+        stages['list_extensions'] = time.time() - start
+    finally:
+        profile.disable()
+        del manager.executor
+        _running.release()
+    stats = pstats.Stats(profile, stream=stream)
+    for p in executor.profiles:
+        stats.add(p)
+    raise gen.Return((stats, stages))
@@ -0,0 +1,88 @@
+"""Rate limiting of requests to the server extension."""
+
+# Copyright (c) Simula Research.
+# Distributed under the terms of the Modified BSD License.
+
+import math
+import time
+
+
+class TokenBucket(object):
+    """A token bucket, refilled at `rate` tokens per second up to `burst` tokens"""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.time()
+
+    def wait_time(self):
+        """The number of seconds until a token is available"""
+        now = time.time()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            return 0
+        return (1 - self.tokens) / self.rate
+
+    def take(self):
+        self.tokens -= 1
+
+
+class RateLimiter(object):
+    """Per-user and global rate limits for a kind of request.
+
+    A rate of zero disables the corresponding limit.
+    """
+
+    def __init__(self, rate, burst, global_rate=0, global_burst=0):
+        self.rate = rate
+        self.burst = burst
+        self._users = {}
+        self._global = None
+        if global_rate > 0:
+            self._global = TokenBucket(global_rate, global_burst)
+
+    def acquire(self, user):
+        """Try to make a request on behalf of a user.
+
+        Returns zero if the request is allowed, otherwise the number of
+        seconds after which it should be retried.
+        """
+        buckets = []
+        if self.rate > 0:
+            if user not in self._users:
+                self._users[user] = TokenBucket(self.rate, self.burst)
+            buckets.append(self._users[user])
+        if self._global is not None:
+            buckets.append(self._global)
+        wait = max([b.wait_time() for b in buckets] + [0])
+        if wait > 0:
+            return int(math.ceil(wait))
+        for bucket in buckets:
+            bucket.take()
+        return 0
+
+
+class RequestLimits(object):
+    """The limits on requests to the server extension
+
+    Mutations (install, uninstall, enable, disable) and refreshes are
+    rate limited separately. In addition, no new mutations are accepted
+    while `max_pending` mutations are waiting to complete.
+    """
+
+    # The number of seconds to ask clients to wait when the queue is full:
+    saturated_retry_after = 10
+
+    def __init__(self, config):
+        self.mutations = RateLimiter(
+            config.mutation_rate, config.mutation_burst,
+            config.global_mutation_rate, config.global_mutation_burst)
+        self.refreshes = RateLimiter(config.refresh_rate, config.refresh_burst)
+        self.max_pending = config.max_pending_mutations
+        self.pending = 0
+
+    def saturated(self):
+        """Whether the queue of pending mutations is full"""
+        return self.max_pending > 0 and self.pending >= self.max_pending
@@ -0,0 +1,249 @@
+"""Helpers for fetching package metadata from the npm registry."""
+
+# Copyright (c) Simula Research.
+# Distributed under the terms of the Modified BSD License.
+
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import closing
+import json
+import socket
+from threading import Lock
+import time
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+try:
+    from urllib.error import HTTPError, URLError
+    from urllib.parse import quote, urljoin
+    from urllib.request import Request, urlopen
+except ImportError:
+    from urllib import quote
+    from urllib2 import HTTPError, Request, URLError, urlopen
+    from urlparse import urljoin
+
+
+# Ask for the abbreviated ("corgi") document where the registry supports it:
+_ACCEPT = ('application/vnd.npm.install-v1+json;'
+           ' q=1.0, application/json; q=0.8, */*')
+
+# The abbreviated document does not include custom fields like `jupyterlab`:
+_ACCEPT_FULL = 'application/json'
+
+# The version fields needed for compatibility checks, and for validating
+# downloaded tarballs:
+COMPAT_FIELDS = ('dependencies', 'dist')
+
+
+# Fields of which only some keys are kept:
+_SUBFIELDS = {
+    'dist': ('shasum', 'integrity'),
+}
+
+
+def _reduce_version(data, fields):
+    """Reduce the metadata of a single version to the given fields"""
+    reduced = dict((f, data[f]) for f in fields if data.get(f) is not None)
+    for field, keys in _SUBFIELDS.items():
+        if field in reduced:
+            reduced[field] = dict((k, reduced[field][k]) for k in keys if k in reduced[field])
+    return reduced
+
+
+def reduce_packument(name, versions, fields=COMPAT_FIELDS):
+    """Create the reduced packument form kept in memory and in caches.
+
+    The reduced form only keeps the version keys, and the given fields
+    of each version. By default, these are the fields needed for
+    compatibility checks.
+
+    Args:
+        name: The name of the package.
+        versions: An iterable of (version, version data) pairs.
+        fields: The version fields to keep.
+    """
+    return dict(
+        name=name,
+        versions=dict((v, _reduce_version(d, fields)) for v, d in versions),
+    )
+
+
+def parse_packument(name, stream, fields=COMPAT_FIELDS):
+    """Parse a packument from a binary stream into its reduced form.
+
+    The document is only parsed incrementally if `ijson` is installed,
+    e.g. with the `streaming` extra of this package. Then only the data
+    of a single version is held in memory at a time. Otherwise, the full
+    document is read and parsed before it is reduced, and only the
+    reduced form is kept.
+    """
+    if ijson is not None:
+        return reduce_packument(name, ijson.kvitems(stream, 'versions'), fields)
+    data = json.loads(stream.read().decode('utf-8'))
+    return reduce_packument(name, data.get('versions', {}).items(), fields)
+
+
+def fetch_package_metadata(registry, name, logger, timeout=None,
+                           fields=COMPAT_FIELDS, full=False):
+    """Fetch the reduced metadata for a package from the npm registry.
+
+    This is a variant of `_fetch_package_metadata` in lab, which
+    avoids keeping the full packument in memory. A timeout while
+    connecting or reading is raised as a URLError.
+
+    Set `full` to fetch the full document instead of the abbreviated
+    one, e.g. to keep the `jupyterlab` field of each version.
+    """
+    req = Request(
+        urljoin(registry, quote(name, safe='@')),
+        headers={'Accept': _ACCEPT_FULL if full else _ACCEPT}
+    )
+    logger.debug('Fetching URL: %s' % req.get_full_url())
+    try:
+        try:
+            with closing(urlopen(req, timeout=timeout)) as response:
+                return parse_packument(name, response, fields)
+        except socket.timeout as exc:
+            raise URLError(exc)
+    except URLError as exc:
+        logger.warning(
+            'Failed to fetch package metadata for %r: %r',
+            name, exc)
+        raise
+
+
+def search_extension_names(registry, logger, timeout=None):
+    """Get the names of all packages with the jupyterlab-extension keyword"""
+    names = []
+    page_size = 250
+    while True:
+        url = urljoin(registry, '/-/v1/search?text=%s&size=%d&from=%d' % (
+            quote('keywords:"jupyterlab-extension"'), page_size, len(names)))
+        logger.debug('Fetching URL: %s' % url)
+        with closing(urlopen(url, timeout=timeout)) as response:
+            result = json.loads(response.read().decode('utf-8'))
+        names.extend(obj['package']['name'] for obj in result['objects'])
+        if not result['objects'] or len(names) >= result['total']:
+            return names
+
+
+class _RegistryHost(object):
+    """Health information for a single registry"""
+
+    def __init__(self, url):
+        self.url = url
+        self.latency = None
+        self.failures = 0
+        self.open_until = 0
+
+    def available(self, now):
+        """Whether the circuit breaker currently allows requests"""
+        return self.open_until <= now
+
+
+class RegistryPool(object):
+    """An ordered list of npm registries/mirrors with failover.
+
+    Requests go to the healthiest registry first (by order, and by
+    measured latency). If it does not respond within `hedge_delay`
+    seconds, the same request is sent to the next registry, and the
+    first successful response is used. Registries that fail repeatedly
+    are skipped for `circuit_reset` seconds.
+    """
+
+    def __init__(self, urls, logger, timeout=None, hedge_delay=2.0,
+                 failure_threshold=3, circuit_reset=60.0):
+        self.hosts = [_RegistryHost(url) for url in urls]
+        self.log = logger
+        self.timeout = timeout
+        self.hedge_delay = hedge_delay
+        self.failure_threshold = failure_threshold
+        self.circuit_reset = circuit_reset
+        self._lock = Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max(2, len(urls)))
+
+    def ranked(self):
+        """The available registries, in the order they should be tried"""
+        now = time.time()
+        with self._lock:
+            hosts = [h for h in self.hosts if h.available(now)]
+            if not hosts:
+                # All circuits are open, try the least recently failed one:
+                hosts = [min(self.hosts, key=lambda h: h.open_until)]
+            order = dict((id(h), i) for i, h in enumerate(self.hosts))
+            # Measured hosts by latency, then untried hosts in configured order:
+            return sorted(hosts, key=lambda h: (
+                h.latency is None, h.latency or 0, order[id(h)]))
+
+    def fetch_package_metadata(self, name):
+        """Fetch the reduced metadata for a package from the best registry.
+
+        Errors of a registry, including invalid responses, are counted
+        against it, and the next registry is tried. Raises URLError if
+        no registry could provide the metadata.
+        """
+        candidates = self.ranked()
+        pending = {}
+        error = None
+        while candidates or pending:
+            if candidates:
+                host = candidates.pop(0)
+                future = self._executor.submit(self._fetch, host, name)
+                pending[future] = host
+            timeout = self.hedge_delay if candidates else None
+            done, _ = wait(list(pending), timeout=timeout,
+                           return_when=FIRST_COMPLETED)
+            for future in done:
+                del pending[future]
+                try:
+                    return future.result()
+                except URLError as e:
+                    error = e
+                except Exception as e:
+                    error = URLError(e)
+        raise error or URLError('No registry available for %r' % name)
+
+    def _fetch(self, host, name):
+        """Fetch metadata from a single host while tracking its health"""
+        start = time.time()
+        try:
+            metadata = fetch_package_metadata(
+                host.url, name, self.log, timeout=self.timeout)
+        except HTTPError as e:
+            # Client errors like 404 mean the host is up, but lacks the package
+            if e.code >= 500:
+                self._record_failure(host)
+            else:
+                self._record_success(host, time.time() - start)
+            raise
+        except URLError:
+            # Connection errors and timeouts
+            self._record_failure(host)
+            raise
+        except Exception as e:
+            # Connection resets, and responses that are not valid packuments
+            self.log.warning('Registry %s failed for %r: %r', host.url, name, e)
+            self._record_failure(host)
+            raise
+        self._record_success(host, time.time() - start)
+        return metadata
+
+    def _record_success(self, host, latency):
+        with self._lock:
+            host.failures = 0
+            host.open_until = 0
+            if host.latency is None:
+                host.latency = latency
+            else:
+                host.latency = 0.8 * host.latency + 0.2 * latency
+
+    def _record_failure(self, host):
+        with self._lock:
+            host.failures += 1
+            if host.failures >= self.failure_threshold:
+                self.log.warning(
+                    'Registry %s failed %d times in a row, skipping it for %s seconds',
+                    host.url, host.failures, self.circuit_reset)
+                host.open_until = time.time() + self.circuit_reset
@@ -0,0 +1,123 @@
+"""Snapshots of the app dir that can be restored without rebuilding."""
+
+# Copyright (c) Simula Research.
+# Distributed under the terms of the Modified BSD License.
+
+import json
+import os
+import shutil
+from threading import Lock
+import time
+
+
+pjoin = os.path.join
+
+# The parts of the app dir that are snapshotted, and whether their files
+# can be hardlinked. Lab replaces files in `extensions` and `static`, but
+# writes settings files in place, so those have to be copied.
+_PARTS = [
+    ('extensions', True),
+    ('settings', False),
+    ('static', True),
+]
+
+
+def _link_or_copy(src, dst):
+    """Hardlink a file, falling back to a copy (e.g. across devices)"""
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+
+
+def _copy_part(src, dst, link):
+    """Copy a directory, hardlinking the files if link is true"""
+    if link:
+        shutil.copytree(src, dst, copy_function=_link_or_copy)
+    else:
+        shutil.copytree(src, dst)
+
+
+class RollbackSnapshots(object):
+    """Snapshots of `extensions`, `settings` and `static` in the app dir.
+
+    A snapshot is taken before each mutation, so that a failed install
+    or build can be undone by restoring the last snapshot, without a
+    rebuild. Files are hardlinked where possible, which makes snapshots
+    cheap. Only the `max_snapshots` most recent snapshots are kept.
+    """
+
+    def __init__(self, app_dir, logger, max_snapshots=3):
+        self.app_dir = app_dir
+        self.root = pjoin(app_dir, 'discovery', 'rollback')
+        self.log = logger
+        self.max_snapshots = max_snapshots
+        self._lock = Lock()
+
+    def list(self):
+        """Get the metadata of the snapshots, most recent first"""
+        if not os.path.isdir(self.root):
+            return []
+        snapshots = []
+        for name in os.listdir(self.root):
+            try:
+                with open(pjoin(self.root, name, 'snapshot.json')) as fid:
+                    snapshots.append(json.load(fid))
+            except (IOError, OSError, ValueError):
+                # Incomplete snapshot
+                continue
+        return sorted(snapshots, key=lambda s: s['created'], reverse=True)
+
+    def take(self, reason):
+        """Take a snapshot of the current state of the app dir"""
+        if self.max_snapshots <= 0:
+            return None
+        with self._lock:
+            snapshot_id = '%d' % (time.time() * 1000)
+            target = pjoin(self.root, snapshot_id)
+            try:
+                os.makedirs(target)
+                for part, link in _PARTS:
+                    src = pjoin(self.app_dir, part)
+                    if os.path.isdir(src):
+                        _copy_part(src, pjoin(target, part), link)
+                meta = dict(id=snapshot_id, created=time.time(), reason=reason)
+                # Written last, marking the snapshot as complete
+                with open(pjoin(target, 'snapshot.json'), 'w') as fid:
+                    json.dump(meta, fid)
+            except (IOError, OSError) as e:
+                self.log.warning('Could not take snapshot of app dir: %s', e)
+                shutil.rmtree(target, ignore_errors=True)
+                return None
+            self._prune()
+        return meta
+
+    def restore(self, snapshot_id=None):
+        """Restore a snapshot, by default the most recent one.
+
+        Returns the metadata of the restored snapshot.
+        """
+        with self._lock:
+            snapshots = self.list()
+            if snapshot_id is not None:
+                snapshots = [s for s in snapshots if s['id'] == snapshot_id]
+            if not snapshots:
+                raise ValueError('No snapshot to restore')
+            meta = snapshots[0]
+            source = pjoin(self.root, meta['id'])
+            for part, link in _PARTS:
+                current = pjoin(self.app_dir, part)
+                old = current + '.discovery-old'
+                if os.path.isdir(current):
+                    shutil.rmtree(old, ignore_errors=True)
+                    os.rename(current, old)
+                if os.path.isdir(pjoin(source, part)):
+                    _copy_part(pjoin(source, part), current, link)
+                shutil.rmtree(old, ignore_errors=True)
+        self.log.info('Restored app dir snapshot from before: %s', meta['reason'])
+        return meta
+
+    def _prune(self):
+        """Remove all but the most recent snapshots"""
+        for meta in self.list()[self.max_snapshots:]:
+            shutil.rmtree(pjoin(self.root, meta['id']), ignore_errors=True)
@@ -0,0 +1,79 @@
+"""Debounced and coalesced builds of an app dir."""
+
+# Copyright (c) Simula Research.
+# Distributed under the terms of the Modified BSD License.
+
+from tornado import gen
+from tornado.concurrent import Future
+from tornado.ioloop import IOLoop
+
+
+class BuildScheduler(object):
+    """Folds build requests for an app dir into as few builds as possible.
+
+    A build starts `delay` seconds after the last request, but at most
+    `max_delay` seconds after the first one. Requests made while a build
+    is running are folded into the next build. All requests served by
+    the same build share its Future.
+
+    Args:
+        build: A callable that runs a build, returning a Future.
+        delay: The number of seconds to wait for further requests.
+        max_delay: The maximal number of seconds to delay a build.
+    """
+
+    def __init__(self, build, delay, max_delay):
+        self._build = build
+        self.delay = delay
+        self.max_delay = max_delay
+        self._pending = None
+        self._first_request = None
+        self._timeout = None
+        self._running = None
+
+    @property
+    def status(self):
+        """The state of the scheduler: 'building', 'scheduled' or 'idle'"""
+        if self._running is not None:
+            return 'building'
+        if self._pending is not None:
+            return 'scheduled'
+        return 'idle'
+
+    def request(self):
+        """Request a build, returning a Future that resolves when it is done"""
+        now = IOLoop.current().time()
+        if self._pending is None:
+            self._pending = Future()
+            self._first_request = now
+        if self._running is None:
+            self._schedule(now)
+        return self._pending
+
+    def _schedule(self, now):
+        """(Re)schedule the pending build"""
+        loop = IOLoop.current()
+        if self._timeout is not None:
+            loop.remove_timeout(self._timeout)
+        deadline = min(now + self.delay, self._first_request + self.max_delay)
+        self._timeout = loop.call_at(deadline, self._start)
+
+    @gen.coroutine
+    def _start(self):
+        """Run the pending build"""
+        self._timeout = None
+        future, self._pending = self._pending, None
+        self._running = future
+        error = result = None
+        try:
+            result = yield self._build()
+        except Exception as e:
+            error = e
+        self._running = None
+        if self._pending is not None:
+            # Requested while building
+            self._schedule(IOLoop.current().time())
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
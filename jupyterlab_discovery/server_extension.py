@@ -7,24 +7,46 @@ def load_jupyter_server_extension(nbapp):
     """
     Called when the extension is loaded.
 
+    Only the routes are registered here. The extension manager is
+    created on the first request, or after a configured delay.
+
     Args:
         nbapp (NotebookWebApplication): handle to the Notebook webserver instance.
     """
 
     from notebook.utils import url_path_join
+    from tornado.ioloop import IOLoop
 
-    from jupyterlab.commands import get_app_dir
-
+    from .config import DiscoveryConfig
     from .handlers import (
-        ExtensionHandler, ExtensionManager, extensions_handler_path,
+        BuildHandler, CompanionsHandler, CompatibilityHandler, EventsHandler,
+        ExtensionHandler, LazyManager, OutdatedHandler, ProfileHandler,
+        RollbackHandler, build_handler_path, companions_handler_path,
+        compatibility_handler_path, events_handler_path,
+        extensions_handler_path, outdated_handler_path, profile_handler_path,
+        rollback_handler_path,
     )
+    from .ratelimit import RequestLimits
     web_app = nbapp.web_app
 
-    app_dir = getattr(nbapp, 'app_dir', get_app_dir())
+    app_dir = getattr(nbapp, 'app_dir', None)
 
-    extension_manager = ExtensionManager(nbapp.log, app_dir)
+    config = DiscoveryConfig(parent=nbapp)
+    extension_manager = LazyManager(nbapp.log, app_dir, config)
+    if config.startup_delay >= 0:
+        IOLoop.current().call_later(config.startup_delay, extension_manager.get)
+    limits = RequestLimits(config)
     handlers = [
-        (extensions_handler_path, ExtensionHandler, {'manager': extension_manager}),
+        (extensions_handler_path, ExtensionHandler,
+         {'manager': extension_manager, 'limits': limits}),
+        (outdated_handler_path, OutdatedHandler, {'manager': extension_manager}),
+        (events_handler_path, EventsHandler, {'manager': extension_manager}),
+        (rollback_handler_path, RollbackHandler, {'manager': extension_manager}),
+        (compatibility_handler_path, CompatibilityHandler, {'manager': extension_manager}),
+        (companions_handler_path, CompanionsHandler, {'manager': extension_manager}),
+        (build_handler_path, BuildHandler, {'manager': extension_manager}),
+        (profile_handler_path, ProfileHandler,
+         {'manager': extension_manager, 'enabled': config.enable_profiling}),
     ]
 
     # Prefix routes with base_url:
@@ -0,0 +1,105 @@
+"""Persisted snapshots of the extension listing."""
+
+# Copyright (c) Simula Research.
+# Distributed under the terms of the Modified BSD License.
+
+import json
+import os
+import time
+
+from jupyterlab import __version__ as lab_version
+
+
+pjoin = os.path.join
+
+# The name of the file the snapshot is persisted to:
+_SNAPSHOT_NAME = 'discovery-snapshot.json'
+
+# The files in the app dir that affect the listing:
+_FINGERPRINT_FILES = [
+    pjoin('settings', 'build_config.json'),
+    pjoin('settings', 'page_config.json'),
+    pjoin('static', 'package.json'),
+]
+
+
+def _stat(path):
+    """Get the stats of a file that matter for the fingerprint, if it exists"""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return [st.st_size, st.st_mtime, st.st_ino]
+
+
+class ListingSnapshot(object):
+    """A snapshot of the last computed listing and outdated versions.
+
+    The snapshot is stored in the staging directory of the app dir,
+    together with a fingerprint of the app dir. It is only valid as long
+    as the fingerprint, and the lab version, are unchanged, and for at
+    most `max_age` seconds, as given when it was saved.
+    """
+
+    def __init__(self, app_dir, logger, max_age=86400):
+        self.app_dir = app_dir
+        self.log = logger
+        self.max_age = max_age
+
+    @property
+    def path(self):
+        return pjoin(self.app_dir, 'staging', _SNAPSHOT_NAME)
+
+    def fingerprint(self):
+        """Compute the current fingerprint of the app dir"""
+        files = dict((name, _stat(pjoin(self.app_dir, name)))
+                     for name in _FINGERPRINT_FILES)
+        ext_dir = pjoin(self.app_dir, 'extensions')
+        extensions = {}
+        if os.path.isdir(ext_dir):
+            for name in os.listdir(ext_dir):
+                extensions[name] = _stat(pjoin(ext_dir, name))
+        return dict(
+            lab_version=lab_version,
+            files=files,
+            extensions=extensions,
+        )
+
+    def load(self):
+        """Load the snapshot, if it is still valid.
+
+        Returns a dict with the keys 'fingerprint', 'listing' and
+        'outdated', or None.
+        """
+        try:
+            with open(self.path) as fid:
+                data = json.load(fid)
+        except (IOError, OSError, ValueError):
+            return None
+        fingerprint = self.fingerprint()
+        if data.get('fingerprint', None) != fingerprint:
+            self.log.debug('Discarding outdated listing snapshot')
+            return None
+        if time.time() > data.get('expires', 0):
+            self.log.debug('Discarding expired listing snapshot')
+            return None
+        return dict(fingerprint=fingerprint, listing=data['listing'],
+                    outdated=data['outdated'])
+
+    def save(self, fingerprint, listing, outdated):
+        """Persist a listing and the outdated versions it was based on
+
+        The fingerprint should be computed before the listing, so that
+        any changes while computing it invalidate the snapshot.
+        """
+        data = dict(
+            fingerprint=fingerprint,
+            expires=time.time() + self.max_age,
+            listing=listing,
+            outdated=outdated,
+        )
+        try:
+            with open(self.path, 'w') as fid:
+                json.dump(data, fid)
+        except (IOError, OSError) as e:
+            self.log.debug('Could not persist listing snapshot: %s', e)
@@ -0,0 +1,116 @@
+"""A content-addressed store of package tarballs."""
+
+# Copyright (c) Simula Research.
+# Distributed under the terms of the Modified BSD License.
+
+import hashlib
+import json
+import os
+import shutil
+from threading import Lock
+
+
+pjoin = os.path.join
+
+
+def _file_digest(path, algorithm):
+    """Compute the hex digest of a file"""
+    digest = hashlib.new(algorithm)
+    with open(path, 'rb') as fid:
+        for chunk in iter(lambda: fid.read(65536), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class TarballStore(object):
+    """A store of validated package tarballs under the app dir.
+
+    Tarballs are stored by the sha256 of their content, and looked up
+    by package name and version through an index. This lets installs
+    and reinstalls of known package versions skip the registry. Only
+    the `max_entries` most recently used package versions are kept.
+    """
+
+    def __init__(self, root, logger, max_entries=64):
+        self.root = root
+        self.log = logger
+        self.max_entries = max_entries
+        self._lock = Lock()
+        self._index = None
+
+    @property
+    def _index_path(self):
+        return pjoin(self.root, 'index.json')
+
+    def _get_index(self):
+        if self._index is None:
+            try:
+                with open(self._index_path) as fid:
+                    self._index = json.load(fid)
+            except (IOError, OSError, ValueError):
+                self._index = {}
+        return self._index
+
+    def get(self, name, version):
+        """Get the path of the stored tarball of a package version, or None"""
+        with self._lock:
+            digest = self._get_index().get('%s@%s' % (name, version), None)
+        if digest is None:
+            return None
+        path = pjoin(self.root, digest + '.tgz')
+        try:
+            # Mark as recently used:
+            os.utime(path, None)
+        except OSError:
+            return None
+        return path
+
+    def add(self, path, name, version, shasum=None):
+        """Add a tarball to the store.
+
+        If shasum is given, it is checked against the sha1 of the tarball,
+        as given in the `dist` field of the registry metadata. Tarballs
+        that do not match are not stored.
+
+        Returns the path of the stored tarball, or None.
+        """
+        if shasum and _file_digest(path, 'sha1') != shasum:
+            self.log.warning('Checksum mismatch for %s@%s, not storing it', name, version)
+            return None
+        digest = _file_digest(path, 'sha256')
+        target = pjoin(self.root, digest + '.tgz')
+        with self._lock:
+            try:
+                if not os.path.exists(self.root):
+                    os.makedirs(self.root)
+                if not os.path.exists(target):
+                    shutil.copyfile(path, target)
+                else:
+                    os.utime(target, None)
+                index = self._get_index()
+                index['%s@%s' % (name, version)] = digest
+                self._prune(index)
+                with open(self._index_path, 'w') as fid:
+                    json.dump(index, fid)
+            except (IOError, OSError) as e:
+                self.log.debug('Could not store tarball of %s@%s: %s', name, version, e)
+                return None
+        return target
+
+    def _prune(self, index):
+        """Remove all but the most recently used package versions"""
+        def last_used(key):
+            try:
+                return os.path.getmtime(pjoin(self.root, index[key] + '.tgz'))
+            except OSError:
+                return 0
+        for key in sorted(index, key=last_used, reverse=True)[self.max_entries:]:
+            del index[key]
+        # Remove the tarballs that are no longer referenced:
+        kept = set(digest + '.tgz' for digest in index.values())
+        for fname in os.listdir(self.root):
+            if fname.endswith('.tgz') and fname not in kept:
+                try:
+                    os.remove(pjoin(self.root, fname))
+                except OSError:
+                    pass
@@ -0,0 +1,43 @@
+# Copyright (c) Simula Research.
+# Distributed under the terms of the Modified BSD License.
+
+import logging
+
+import pytest
+
+pytest.importorskip('jupyterlab')
+
+from ..buildcache import BuildCache  # noqa: E402
+
+
+def _info(core_version, build_version, extensions):
+    return dict(
+        version=build_version,
+        core_data=dict(jupyterlab=dict(version=core_version)),
+        extensions=dict((name, dict(version=v)) for name, v in extensions.items()),
+        local_extensions={},
+        linked_packages={},
+    )
+
+
+def test_key_follows_running_lab_version(tmpdir):
+    cache = BuildCache(str(tmpdir), logging.getLogger())
+    before = cache.key(_info('0.32.0', '0.32.0', {'foo': '1.0.0'}))
+    upgraded = cache.key(_info('0.32.1', '0.32.0', {'foo': '1.0.0'}))
+    rebuilt = cache.key(_info('0.32.1', '0.32.1', {'foo': '1.0.0'}))
+    assert before != upgraded
+    assert upgraded == rebuilt
+
+
+def test_key_follows_extensions(tmpdir):
+    cache = BuildCache(str(tmpdir), logging.getLogger())
+    key = cache.key(_info('0.32.1', '0.32.1', {'foo': '1.0.0'}))
+    assert key != cache.key(_info('0.32.1', '0.32.1', {'foo': '1.1.0'}))
+    assert key != cache.key(_info('0.32.1', '0.32.1', {'foo': '1.0.0', 'bar': '1.0.0'}))
+
+
+def test_local_extensions_are_not_cached(tmpdir):
+    cache = BuildCache(str(tmpdir), logging.getLogger())
+    info = _info('0.32.1', '0.32.1', {'foo': '1.0.0'})
+    info['local_extensions'] = {'foo': '/src/foo'}
+    assert cache.key(info) is None
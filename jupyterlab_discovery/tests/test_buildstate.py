@@ -0,0 +1,63 @@
+# Copyright (c) Simula Research.
+# Distributed under the terms of the Modified BSD License.
+
+import io
+import json
+import logging
+import os
+import tarfile
+
+import pytest
+
+pytest.importorskip('jupyterlab')
+
+from ..buildstate import BuildState  # noqa: E402
+from ..cache import PackageCache  # noqa: E402
+
+
+pjoin = os.path.join
+
+
+def _make_tarball(path, name, version):
+    data = json.dumps(dict(name=name, version=version)).encode('utf-8')
+    with tarfile.open(path, 'w:gz') as tar:
+        member = tarfile.TarInfo('package/package.json')
+        member.size = len(data)
+        tar.addfile(member, io.BytesIO(data))
+
+
+def _make_app_dir(root):
+    app_dir = str(root)
+    for sub in ('extensions', 'staging', 'static'):
+        os.makedirs(pjoin(app_dir, sub))
+    tarball = pjoin(app_dir, 'extensions', 'foo-1.0.0.tgz')
+    _make_tarball(tarball, 'foo', '1.0.0')
+    # Written the way lab writes it, relative to the staging directory:
+    static_data = dict(
+        dependencies={'foo': 'file:../extensions/foo-1.0.0.tgz'},
+        jupyterlab=dict(extensions={'foo': ''}, mimeExtensions={}),
+    )
+    with open(pjoin(app_dir, 'static', 'package.json'), 'w') as fid:
+        json.dump(static_data, fid)
+    info = dict(
+        core_data=dict(jupyterlab=dict(extensions={}, mimeExtensions={})),
+        extensions={'foo': dict(version='1.0.0', path=tarball)},
+    )
+    return app_dir, info
+
+
+def test_built_extension_is_up_to_date(tmpdir, monkeypatch):
+    app_dir, info = _make_app_dir(tmpdir.join('app'))
+    # The paths must not be resolved against the working directory:
+    monkeypatch.chdir(str(tmpdir))
+    state = BuildState(app_dir, logging.getLogger(), PackageCache())
+    assert state.check(info) == {'install': [], 'uninstall': [], 'update': []}
+
+
+def test_changed_extension_needs_update(tmpdir):
+    app_dir, info = _make_app_dir(tmpdir.join('app'))
+    state = BuildState(app_dir, logging.getLogger(), PackageCache())
+    tarball = pjoin(app_dir, 'extensions', 'foo-1.1.0.tgz')
+    _make_tarball(tarball, 'foo', '1.1.0')
+    info['extensions']['foo'] = dict(version='1.1.0', path=tarball)
+    assert state.check(info)['update'] == ['foo']
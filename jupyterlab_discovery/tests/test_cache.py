@@ -0,0 +1,125 @@
+# Copyright (c) Simula Research.
+# Distributed under the terms of the Modified BSD License.
+
+import json
+import logging
+import os
+import stat
+
+from ..cache import MetadataCache, PackageCache, SharedCache
+
+
+def _write_json(path, data, mtime):
+    with open(path, 'w') as fid:
+        json.dump(data, fid)
+    os.utime(path, (mtime, mtime))
+
+
+def test_package_cache_reuses_unchanged_files(tmpdir, monkeypatch):
+    path = str(tmpdir.join('package.json'))
+    _write_json(path, dict(name='foo', version='1.0.0'), 1000)
+    cache = PackageCache()
+    assert cache.read_json(path)['version'] == '1.0.0'
+    # Fail any further reads from disk:
+    monkeypatch.setattr(
+        'jupyterlab_discovery.cache._load_json', lambda path: 1 / 0)
+    assert cache.read_json(path)['version'] == '1.0.0'
+
+
+def test_package_cache_invalidates_changed_files(tmpdir):
+    path = str(tmpdir.join('package.json'))
+    _write_json(path, dict(name='foo', version='1.0.0'), 1000)
+    cache = PackageCache()
+    cache.read_json(path)
+    _write_json(path, dict(name='foo', version='1.10.0'), 2000)
+    assert cache.read_json(path)['version'] == '1.10.0'
+
+
+def test_package_cache_evicts_least_recently_used(tmpdir):
+    paths = [str(tmpdir.join('%d.json' % i)) for i in range(3)]
+    for i, path in enumerate(paths):
+        _write_json(path, dict(name=str(i)), 1000)
+    cache = PackageCache(max_entries=2)
+    cache.read_json(paths[0])
+    cache.read_json(paths[1])
+    cache.read_json(paths[0])
+    cache.read_json(paths[2])
+    assert list(cache._entries) == [paths[0], paths[2]]
+
+
+def test_package_cache_returns_copies(tmpdir):
+    path = str(tmpdir.join('package.json'))
+    _write_json(path, dict(name='foo'), 1000)
+    cache = PackageCache()
+    cache.read_json(path)['name'] = 'bar'
+    assert cache.read_json(path)['name'] == 'foo'
+
+
+def _shared_cache(tmpdir, ttl=3600):
+    return SharedCache(str(tmpdir.join('shared')), ttl, logging.getLogger())
+
+
+def test_shared_cache_round_trip(tmpdir):
+    cache = _shared_cache(tmpdir)
+    assert cache.get_metadata('foo') is None
+    assert cache.get_compatible('foo', '0.32.1') == (False, None)
+    cache.set_metadata('foo', dict(name='foo', versions={}))
+    cache.set_compatible('foo', '0.32.1', '1.0.0')
+    cache.set_compatible('bar', '0.32.1', None)
+    assert cache.get_metadata('foo') == dict(name='foo', versions={})
+    assert cache.get_compatible('foo', '0.32.1') == (True, '1.0.0')
+    assert cache.get_compatible('foo', '0.31.0') == (False, None)
+    # A known lack of a compatible version is a hit:
+    assert cache.get_compatible('bar', '0.32.1') == (True, None)
+
+
+def test_shared_cache_entries_expire(tmpdir):
+    cache = _shared_cache(tmpdir, ttl=-1)
+    cache.set_metadata('foo', dict(name='foo', versions={}))
+    cache.set_compatible('foo', '0.32.1', '1.0.0')
+    assert cache.get_metadata('foo') is None
+    assert cache.get_compatible('foo', '0.32.1') == (False, None)
+
+
+def test_shared_cache_expiry_is_set_by_writer(tmpdir):
+    _shared_cache(tmpdir, ttl=3600).set_compatible('foo', '0.32.1', '1.0.0')
+    reader = _shared_cache(tmpdir, ttl=-1)
+    assert reader.get_compatible('foo', '0.32.1') == (True, '1.0.0')
+
+
+def test_shared_cache_ignores_invalid_versions(tmpdir):
+    cache = _shared_cache(tmpdir)
+    cache.set_compatible('foo', '0.32.1', 'file:/tmp/evil.tgz')
+    assert cache.get_compatible('foo', '0.32.1') == (False, None)
+
+
+def test_shared_cache_is_not_world_writable(tmpdir):
+    cache = _shared_cache(tmpdir)
+    assert not os.stat(cache.path).st_mode & stat.S_IWOTH
+
+
+def test_shared_cache_errors_are_misses(tmpdir):
+    cache = _shared_cache(tmpdir)
+    with open(cache.path, 'w') as fid:
+        fid.write('not a database')
+    assert cache.get_metadata('foo') is None
+    cache.set_metadata('foo', dict(name='foo', versions={}))
+
+
+def test_metadata_cache_evicts_least_recently_used():
+    cache = MetadataCache(max_entries=2)
+    cache['foo'] = dict(name='foo')
+    cache['bar'] = dict(name='bar')
+    assert cache.get('foo') == dict(name='foo')
+    cache['baz'] = dict(name='baz')
+    assert cache.get('bar') is None
+    assert cache.get('foo') == dict(name='foo')
+    assert cache.get('baz') == dict(name='baz')
+
+
+def test_metadata_cache_replaces_entries():
+    cache = MetadataCache(max_entries=2)
+    cache['foo'] = dict(name='foo', versions={})
+    cache['foo'] = dict(name='foo', versions={'1.0.0': {}})
+    assert cache.get('foo') == dict(name='foo', versions={'1.0.0': {}})
+    assert cache.get('bar', 'default') == 'default'
@@ -0,0 +1,40 @@
+# Copyright (c) Simula Research.
+# Distributed under the terms of the Modified BSD License.
+
+import pytest
+
+from ..compatdb import CompatDatabase
+
+
+def _export(path):
+    db = CompatDatabase(path, writable=True)
+    try:
+        db.add_metadata(dict(name='foo', versions={
+            '1.0.0': dict(dependencies={'@jupyterlab/application': '^0.15.0'}),
+            '1.1.0': dict(
+                dependencies={'@jupyterlab/application': '^0.16.0'},
+                jupyterlab=dict(discovery=dict(server=dict(base=dict(name='foo')))),
+            ),
+        }))
+    finally:
+        db.close()
+
+
+def test_lookups(tmpdir):
+    path = str(tmpdir.join('compat.sqlite'))
+    _export(path)
+    db = CompatDatabase(path)
+    metadata = db.get_metadata('foo')
+    assert sorted(metadata['versions']) == ['1.0.0', '1.1.0']
+    assert metadata['versions']['1.0.0']['dependencies'] == {
+        '@jupyterlab/application': '^0.15.0'}
+    assert db.get_metadata('bar') is None
+    assert db.get_discovery('foo', '1.1.0') == dict(server=dict(base=dict(name='foo')))
+    assert db.get_discovery('foo', '1.0.0') is None
+
+
+def test_missing_database(tmpdir):
+    path = str(tmpdir.join('missing.sqlite'))
+    with pytest.raises(IOError):
+        CompatDatabase(path)
+    assert not tmpdir.join('missing.sqlite').exists()
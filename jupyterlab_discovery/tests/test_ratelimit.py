@@ -0,0 +1,72 @@
+# Copyright (c) Simula Research.
+# Distributed under the terms of the Modified BSD License.
+
+import pytest
+
+from .. import ratelimit
+from ..config import DiscoveryConfig
+from ..ratelimit import RateLimiter, RequestLimits
+
+
+class _Clock(object):
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(ratelimit, 'time', clock)
+    return clock
+
+
+def test_burst_then_rate(clock):
+    limiter = RateLimiter(rate=0.5, burst=2)
+    assert limiter.acquire('alice') == 0
+    assert limiter.acquire('alice') == 0
+    assert limiter.acquire('alice') == 2
+    clock.now += 2
+    assert limiter.acquire('alice') == 0
+    assert limiter.acquire('alice') == 2
+
+
+def test_users_are_limited_separately(clock):
+    limiter = RateLimiter(rate=0.1, burst=1)
+    assert limiter.acquire('alice') == 0
+    assert limiter.acquire('alice') > 0
+    assert limiter.acquire('bob') == 0
+
+
+def test_global_limit(clock):
+    limiter = RateLimiter(rate=1, burst=5, global_rate=0.5, global_burst=2)
+    assert limiter.acquire('alice') == 0
+    assert limiter.acquire('bob') == 0
+    assert limiter.acquire('carol') == 2
+
+
+def test_rejected_requests_take_no_tokens(clock):
+    limiter = RateLimiter(rate=1, burst=5, global_rate=0.5, global_burst=1)
+    assert limiter.acquire('alice') == 0
+    for _ in range(3):
+        assert limiter.acquire('alice') > 0
+    clock.now += 2
+    assert limiter.acquire('alice') == 0
+
+
+def test_zero_rate_disables_limit(clock):
+    limiter = RateLimiter(rate=0, burst=0)
+    for _ in range(100):
+        assert limiter.acquire('alice') == 0
+
+
+def test_saturated():
+    limits = RequestLimits(DiscoveryConfig(max_pending_mutations=2))
+    assert not limits.saturated()
+    limits.pending = 2
+    assert limits.saturated()
+    limits = RequestLimits(DiscoveryConfig(max_pending_mutations=0))
+    limits.pending = 100
+    assert not limits.saturated()
@@ -0,0 +1,80 @@
+# Copyright (c) Simula Research.
+# Distributed under the terms of the Modified BSD License.
+
+import logging
+
+import pytest
+
+from .. import registry
+from ..registry import RegistryPool
+
+try:
+    from urllib.error import HTTPError, URLError
+except ImportError:
+    from urllib2 import HTTPError, URLError
+
+
+def _stub_fetch(monkeypatch, responses):
+    """Make each registry answer with the result, or raise the exception, given for it"""
+    calls = []
+
+    def fetch(url, name, logger, timeout=None):
+        calls.append(url)
+        response = responses[url]
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+    monkeypatch.setattr(registry, 'fetch_package_metadata', fetch)
+    return calls
+
+
+def _pool(urls, **kwargs):
+    kwargs.setdefault('hedge_delay', 10)
+    return RegistryPool(urls, logging.getLogger(), **kwargs)
+
+
+@pytest.mark.parametrize('exc', [
+    URLError('refused'),
+    HTTPError('a', 503, 'Unavailable', {}, None),
+    IOError('Connection reset by peer'),
+    ValueError('No JSON object could be decoded'),
+])
+def test_failover_on_host_error(monkeypatch, exc):
+    calls = _stub_fetch(monkeypatch, {'a': exc, 'b': {'name': 'foo'}})
+    pool = _pool(['a', 'b'])
+    assert pool.fetch_package_metadata('foo') == {'name': 'foo'}
+    assert calls == ['a', 'b']
+    assert [h.failures for h in pool.hosts] == [1, 0]
+
+
+def test_missing_package_is_not_a_host_failure(monkeypatch):
+    _stub_fetch(monkeypatch, {'a': HTTPError('a', 404, 'Not Found', {}, None)})
+    pool = _pool(['a'])
+    with pytest.raises(URLError):
+        pool.fetch_package_metadata('foo')
+    assert pool.hosts[0].failures == 0
+
+
+def test_raises_after_all_hosts_failed(monkeypatch):
+    calls = _stub_fetch(monkeypatch, {'a': ValueError('bad'), 'b': IOError('reset')})
+    pool = _pool(['a', 'b'])
+    with pytest.raises(URLError):
+        pool.fetch_package_metadata('foo')
+    assert sorted(calls) == ['a', 'b']
+
+
+def test_circuit_opens_after_repeated_failures(monkeypatch):
+    calls = _stub_fetch(monkeypatch, {'a': URLError('refused'), 'b': {'name': 'foo'}})
+    pool = _pool(['a', 'b'], failure_threshold=2, circuit_reset=60)
+    for _ in range(2):
+        pool.fetch_package_metadata('foo')
+    del calls[:]
+    pool.fetch_package_metadata('foo')
+    assert calls == ['b']
+
+
+def test_untried_hosts_keep_configured_order(monkeypatch):
+    pool = _pool(['a', 'b', 'c'])
+    pool.hosts[2].latency = 0.5
+    assert [h.url for h in pool.ranked()] == ['c', 'a', 'b']
@@ -0,0 +1,103 @@
+# Copyright (c) Simula Research.
+# Distributed under the terms of the Modified BSD License.
+
+import pytest
+
+pytest.importorskip('tornado')
+
+from tornado import gen  # noqa: E402
+from tornado.ioloop import IOLoop  # noqa: E402
+
+from ..scheduler import BuildScheduler  # noqa: E402
+
+
+class _Builds(object):
+    """A build function that records its calls"""
+
+    def __init__(self, duration=0, error=None):
+        self.duration = duration
+        self.error = error
+        self.count = 0
+
+    @gen.coroutine
+    def __call__(self):
+        self.count += 1
+        yield gen.sleep(self.duration)
+        if self.error is not None:
+            raise self.error
+        raise gen.Return(self.count)
+
+
+def _run(func):
+    return IOLoop.current().run_sync(func, timeout=10)
+
+
+def test_requests_are_coalesced():
+    builds = _Builds()
+
+    @gen.coroutine
+    def run():
+        scheduler = BuildScheduler(builds, 0.05, 1)
+        first = scheduler.request()
+        yield gen.sleep(0.02)
+        second = scheduler.request()
+        assert scheduler.status == 'scheduled'
+        results = yield [first, second]
+        raise gen.Return(results)
+
+    assert _run(run) == [1, 1]
+    assert builds.count == 1
+
+
+def test_max_delay_bounds_debouncing():
+    builds = _Builds()
+
+    @gen.coroutine
+    def run():
+        scheduler = BuildScheduler(builds, 0.1, 0.15)
+        future = scheduler.request()
+        start = IOLoop.current().time()
+        # Keep requesting within the delay:
+        while not future.done():
+            scheduler.request()
+            yield gen.sleep(0.05)
+        raise gen.Return(IOLoop.current().time() - start)
+
+    assert _run(run) < 0.5
+
+
+def test_requests_while_building_get_the_next_build():
+    builds = _Builds(duration=0.1)
+
+    @gen.coroutine
+    def run():
+        scheduler = BuildScheduler(builds, 0.01, 1)
+        first = scheduler.request()
+        yield gen.sleep(0.05)
+        assert scheduler.status == 'building'
+        second = scheduler.request()
+        results = yield [first, second]
+        raise gen.Return(results)
+
+    assert _run(run) == [1, 2]
+    assert builds.count == 2
+
+
+def test_failed_build_is_reported_to_all_requests():
+    builds = _Builds(error=RuntimeError('JupyterLab failed to build'))
+
+    @gen.coroutine
+    def run():
+        scheduler = BuildScheduler(builds, 0.01, 1)
+        futures = [scheduler.request(), scheduler.request()]
+        errors = []
+        for future in futures:
+            try:
+                yield future
+            except RuntimeError as e:
+                errors.append(str(e))
+        raise gen.Return((errors, scheduler.status))
+
+    errors, status = _run(run)
+    assert errors == ['JupyterLab failed to build'] * 2
+    assert status == 'idle'
@@ -0,0 +1,46 @@
+# Copyright (c) Simula Research.
+# Distributed under the terms of the Modified BSD License.
+
+import logging
+import os
+
+from ..tarballs import TarballStore
+
+
+def _make_file(tmpdir, name):
+    path = tmpdir.join(name)
+    path.write(name)
+    return str(path)
+
+
+def _set_mtime(path, mtime):
+    os.utime(path, (mtime, mtime))
+
+
+def test_get_stored_tarball(tmpdir):
+    store = TarballStore(str(tmpdir.join('store')), logging.getLogger())
+    stored = store.add(_make_file(tmpdir, 'foo.tgz'), 'foo', '1.0.0')
+    assert store.get('foo', '1.0.0') == stored
+    assert store.get('foo', '1.1.0') is None
+
+
+def test_checksum_mismatch_is_not_stored(tmpdir):
+    store = TarballStore(str(tmpdir.join('store')), logging.getLogger())
+    assert store.add(_make_file(tmpdir, 'foo.tgz'), 'foo', '1.0.0', 'bad') is None
+    assert store.get('foo', '1.0.0') is None
+
+
+def test_least_recently_used_are_pruned(tmpdir):
+    root = tmpdir.join('store')
+    store = TarballStore(str(root), logging.getLogger(), max_entries=2)
+    foo = store.add(_make_file(tmpdir, 'foo.tgz'), 'foo', '1.0.0')
+    bar = store.add(_make_file(tmpdir, 'bar.tgz'), 'bar', '1.0.0')
+    _set_mtime(foo, 1000)
+    _set_mtime(bar, 2000)
+    # Using foo makes bar the least recently used:
+    assert store.get('foo', '1.0.0') == foo
+    store.add(_make_file(tmpdir, 'baz.tgz'), 'baz', '1.0.0')
+    assert store.get('bar', '1.0.0') is None
+    assert not os.path.exists(bar)
+    assert store.get('foo', '1.0.0') == foo
+    assert len([f for f in root.listdir() if f.ext == '.tgz']) == 2
@@ -69,6 +69,10 @@ setup_args = dict(
     ],
     extras_require  = {
         'test': [
+            'pytest',
+        ],
+        'streaming': [
+            'ijson',
         ],
     },
     author          = 'Vidar Tonaas Fauske',
@@ -5,6 +5,10 @@ import {
   Dialog, showDialog
 } from '@jupyterlab/apputils';
 
+import {
+  ServerConnection
+} from '@jupyterlab/services';
+
 import {
   BuildManager
 } from '@jupyterlab/services/lib/builder';
@@ -12,31 +16,73 @@ import {
 import * as React from 'react';
 
 
+/**
+ * The server API path for requesting builds.
+ */
+const BUILD_API_PATH = "discovery/api/build"
+
+
 /**
  * Instruct the server to perform a build
  *
- * @param builder the build manager
+ * The server folds build requests made in short succession, also from
+ * other clients, into a single build.
+ *
+ * @param settings the settings for connecting to the server
  */
 export
-function doBuild(builder: BuildManager): Promise<void> {
-  if (builder.isAvailable) {
-    return builder.build().then(() => {
-      return showDialog({
-        title: 'Build Complete',
-        body: 'Build successfully completed, reload page?',
-        buttons: [Dialog.cancelButton(),
-                  Dialog.warnButton({ label: 'RELOAD' })]
-        });
-    }).then(result => {
-      if (result.button.accept) {
-        location.reload();
+function doBuild(settings: ServerConnection.ISettings): Promise<void> {
+  const url = new URL(BUILD_API_PATH, settings.baseUrl);
+  const build = ServerConnection.makeRequest(
+    url.toString(), {method: 'POST'}, settings).then((response) => {
+      if (!response.ok) {
+        throw new Error(`${response.status} (${response.statusText})`);
+      }
+      return response.json();
+    }).then((data: {status: string, message?: string}) => {
+      if (data.status !== 'ok') {
+        throw new Error(data.message);
       }
-    }).catch(err => {
-      showDialog({
-        title: 'Build Failed',
-        body: (<pre>{err.message}</pre>),
-      });
     });
+  return reportBuild(build);
+}
+
+
+/**
+ * Wait for a build already running in the lab build manager
+ *
+ * @param builder the build manager
+ */
+export
+function joinBuild(builder: BuildManager): Promise<void> {
+  if (builder.isAvailable) {
+    return reportBuild(builder.build());
   }
   return Promise.resolve();
+}
+
+
+/**
+ * Report the outcome of a build to the user
+ *
+ * @param build the promise of the build
+ */
+function reportBuild(build: Promise<void>): Promise<void> {
+  return build.then(() => {
+    return showDialog({
+      title: 'Build Complete',
+      body: 'Build successfully completed, reload page?',
+      buttons: [Dialog.cancelButton(),
+                Dialog.warnButton({ label: 'RELOAD' })]
+      });
+  }).then(result => {
+    if (result.button.accept) {
+      location.reload();
+    }
+  }).catch(err => {
+    showDialog({
+      title: 'Build Failed',
+      body: (<pre>{err.message}</pre>),
+    });
+  });
 };
@@ -11,11 +11,11 @@ import {
 import * as semver from 'semver';
 
 import {
-  doBuild
+  doBuild, joinBuild
 } from './build-helper';
 
 import {
-  Searcher, ISearchResult, IKernelInstallInfo
+  Searcher, ISearchResult, IKernelInstallInfo, IDiscoveryMetadata
 } from './query';
 
 import {
@@ -36,8 +36,13 @@ interface IEntry {
   installed: boolean;
   enabled: boolean;
   status: 'ok' | 'warning' | 'error' | 'deprecated' | null;
-  latest_version: string;
+  latest_version: string | null;
   installed_version: string;
+
+  /**
+   * The compatibility of the extension with the running lab, if known.
+   */
+  compatibility?: ICompatibilityInfo;
 }
 
 
@@ -54,6 +59,52 @@ interface IInstalledEntry {
   latest_version: string;
   installed_version: string;
   status: 'ok' | 'warning' | 'error' | 'deprecated' | null;
+
+  /**
+   * Whether the server is still checking for the latest version.
+   *
+   * If true, the latest version can be fetched from the outdated API.
+   */
+  latest_version_pending?: boolean;
+}
+
+/**
+ * An event pushed from the server extension.
+ */
+export
+type ServerEvent = {
+  type: 'extensions';
+  changed: IInstalledEntry[];
+  removed: string[];
+} | {
+  type: 'outdated';
+  outdated: IOutdatedInfo;
+};
+
+/**
+ * The latest compatible versions of outdated extensions, keyed by name.
+ */
+export
+interface IOutdatedInfo {
+  [key: string]: string;
+}
+
+/**
+ * The compatibility of a package with the running lab.
+ */
+export
+interface ICompatibilityInfo {
+  status: 'compatible' | 'incompatible' | 'unknown';
+
+  /**
+   * The latest version that is compatible, if any.
+   */
+  latest_version?: string;
+
+  /**
+   * Why the package is incompatible, or could not be checked.
+   */
+  message?: string;
 }
 
 export
@@ -75,6 +126,26 @@ interface IActionReply {
  */
 const EXTENSION_API_PATH = "discovery/api/extensions"
 
+/**
+ * The server API path for querying the latest versions of installed extensions.
+ */
+const OUTDATED_API_PATH = "discovery/api/outdated"
+
+/**
+ * The server API path for checking the compatibility of packages.
+ */
+const COMPATIBILITY_API_PATH = "discovery/api/compatibility"
+
+/**
+ * The server API path for the discovery metadata of packages in offline mode.
+ */
+const COMPANIONS_API_PATH = "discovery/api/companions"
+
+/**
+ * The server API path for the websocket pushing change events.
+ */
+const EVENTS_API_PATH = "discovery/api/events"
+
 /**
  * Extension actions that the server API accepts
  */
@@ -153,15 +224,7 @@ class ListModel extends VDomModel {
     const entries: {[key: string]: IEntry} = {};
     for (let pkg of await res) {
       promises.push(res.then((info) => {
-        entries[pkg.name] = {
-          name: pkg.name,
-          description: pkg.description,
-          installed: pkg.installed !== false,
-          enabled: pkg.enabled,
-          status: pkg.status,
-          latest_version: pkg.latest_version,
-          installed_version: pkg.installed_version,
-        };
+        entries[pkg.name] = installedToEntry(pkg);
       }));
     }
     return Promise.all(promises).then(() => {
@@ -172,14 +235,21 @@ class ListModel extends VDomModel {
   /**
    * The current NPM repository search query.
    *
-   * Setting its value triggers a new search.
+   * Setting its value triggers a new search, once the query has been
+   * unchanged for `searchDebounce` milliseconds.
    */
   get query(): string {
     return this._query
   }
   set query(value: string) {
     this._query = value;
-    this.update();
+    if (this._searchTimer !== null) {
+      clearTimeout(this._searchTimer);
+    }
+    this._searchTimer = window.setTimeout(() => {
+      this._searchTimer = null;
+      this.updateSearch();
+    }, this.searchDebounce);
   }
 
   /**
@@ -195,7 +265,7 @@ class ListModel extends VDomModel {
   }
   set page(value: number) {
     this._page = value;
-    this.update();
+    this.updateSearch();
   }
 
   /**
@@ -211,7 +281,7 @@ class ListModel extends VDomModel {
   }
   set pagination(value: number) {
     this._pagination = value;
-    this.update();
+    this.updateSearch();
   }
 
   /**
@@ -242,10 +312,175 @@ class ListModel extends VDomModel {
     return request;
   }
 
+  /**
+   * Make a request to the server for the latest versions of installed extensions.
+   */
+  protected fetchOutdated(): Promise<IOutdatedInfo> {
+    const url = new URL(OUTDATED_API_PATH, this.serverConnectionSettings.baseUrl);
+    return ServerConnection.makeRequest(
+      url.toString(), {}, this.serverConnectionSettings).then((response) => {
+        handleError(response);
+        return response.json() as Promise<IOutdatedInfo>;
+      });
+  }
+
+  /**
+   * Make a request to the server for the compatibility of packages with lab.
+   *
+   * @param names The names of the packages to check.
+   */
+  protected fetchCompatibility(names: string[]): Promise<{[key: string]: ICompatibilityInfo}> {
+    const url = new URL(COMPATIBILITY_API_PATH, this.serverConnectionSettings.baseUrl);
+    const request: RequestInit = {
+      method: 'POST',
+      body: JSON.stringify({names}),
+    };
+    return ServerConnection.makeRequest(
+      url.toString(), request, this.serverConnectionSettings).then((response) => {
+        handleError(response);
+        return response.json() as Promise<{[key: string]: ICompatibilityInfo}>;
+      });
+  }
+
+  /**
+   * Annotate the search results with their compatibility once the server has checked it.
+   *
+   * @param searchId The id of the search whose results to annotate.
+   */
+  protected async updateCompatibility(searchId: number) {
+    const names = Object.keys(this._searchMap);
+    if (names.length === 0) {
+      return;
+    }
+    let compatibility: {[key: string]: ICompatibilityInfo};
+    try {
+      compatibility = await this.fetchCompatibility(names);
+    } catch (reason) {
+      // The results are still usable without annotations
+      return;
+    }
+    if (searchId !== this._searchId) {
+      return;
+    }
+    const searchMap: {[key: string]: IEntry} = {};
+    for (let key of names) {
+      const entry = this._searchMap[key];
+      const info = compatibility[key];
+      searchMap[key] = info === undefined ? entry : {
+        ...entry,
+        compatibility: info,
+        // Offer the version that would actually be installed:
+        latest_version: info.latest_version || entry.latest_version,
+      };
+    }
+    this._searchMap = searchMap;
+    this.mergeSearchResult();
+    this.stateChanged.emit(undefined);
+  }
+
+  /**
+   * Fill in the latest versions of installed entries once the server has them.
+   *
+   * @param pending The installed entries whose latest version is pending.
+   */
+  protected async updateOutdated(pending: IEntry[]) {
+    let outdated: IOutdatedInfo;
+    try {
+      outdated = await this.fetchOutdated();
+    } catch (reason) {
+      outdated = {};
+    }
+    // Replace the entries, so that views can tell that they changed:
+    this._installed = this._installed.map((entry) => {
+      if (pending.indexOf(entry) === -1) {
+        return entry;
+      }
+      return {...entry, latest_version: outdated[entry.name] || entry.installed_version};
+    });
+    this.mergeSearchResult();
+    this.stateChanged.emit(undefined);
+  }
+
+  /**
+   * Connect to the websocket on which the server pushes change events.
+   *
+   * While connected, changes are applied from the events, and the model
+   * does not have to query the server after each action.
+   */
+  protected connectEvents(): void {
+    const settings = this.serverConnectionSettings;
+    const url = new URL(EVENTS_API_PATH, settings.wsUrl);
+    if (settings.token) {
+      url.searchParams.append('token', settings.token);
+    }
+    const socket = new settings.WebSocket(url.toString());
+    socket.onopen = () => {
+      this._events = socket;
+    };
+    socket.onclose = () => {
+      this._events = null;
+    };
+    socket.onmessage = (msg: MessageEvent) => {
+      this.onServerEvent(JSON.parse(msg.data) as ServerEvent);
+    };
+  }
+
+  /**
+   * Apply an event pushed from the server.
+   *
+   * @param event The event to apply.
+   */
+  protected onServerEvent(event: ServerEvent): void {
+    if (event.type === 'outdated') {
+      this._installed = this._installed.map((entry) => {
+        const latest = event.outdated[entry.name] || entry.installed_version;
+        return latest === entry.latest_version ? entry : {...entry, latest_version: latest};
+      });
+      this.mergeSearchResult();
+    } else if (event.type === 'extensions') {
+      const changed: {[key: string]: IEntry} = {};
+      for (let pkg of event.changed) {
+        changed[pkg.name] = installedToEntry(pkg);
+      }
+      let installed: IEntry[] = [];
+      for (let entry of this._installed) {
+        if (event.removed.indexOf(entry.name) !== -1) {
+          continue;
+        }
+        if (changed[entry.name] !== undefined) {
+          installed.push(changed[entry.name]);
+          delete changed[entry.name];
+        } else {
+          installed.push(entry);
+        }
+      }
+      for (let key of Object.keys(changed)) {
+        installed.push(changed[key]);
+      }
+      this._installed = installed;
+      this.mergeSearchResult();
+    }
+    this.stateChanged.emit(undefined);
+  }
+
+  /**
+   * Update the model after an action, unless the server pushes the changes.
+   *
+   * Actions cannot change the search results, so only the installed
+   * extensions are queried.
+   */
+  protected updateAfterAction(): Promise<void> {
+    if (this._events !== null) {
+      return Promise.resolve();
+    }
+    return this.updateInstalled();
+  }
+
   /**
    * Initialize the model.
    */
   initialize() {
+    this.connectEvents();
     this.update().then(() => {
       this.initialized = true;
       this.stateChanged.emit(undefined);
@@ -263,38 +498,89 @@ class ListModel extends VDomModel {
    * Emits the `stateChanged` signal on succesfull completion.
    */
   protected async update(refreshInstalled=false) {
-    let search = this.searcher.searchExtensions(this.query, this.page, this.pagination);
-    let searchMapPromise = this.translateSearchResult(search);
+    await Promise.all([
+      this.updateInstalled(refreshInstalled),
+      this.updateSearch(),
+    ]);
+  }
+
+  /**
+   * Update the installed extensions from the notebook server.
+   *
+   * Only needed when the installed state can have changed, as the
+   * server has to check the app dir to answer.
+   */
+  protected async updateInstalled(refreshInstalled=false) {
     let installedMap = await this.translateInstalled(this.fetchInstalled(refreshInstalled));
-    let searchMap;
-    try {
-      searchMap = await searchMapPromise;
-      this.searchError = null;
-    } catch (reason) {
-      searchMap = {};
-      this.searchError = reason.toString();
-    }
     let installed: IEntry[] = [];
+    let pending: IEntry[] = [];
     for (let key of Object.keys(installedMap)) {
       installed.push(installedMap[key]);
+      if (installedMap[key].latest_version === null) {
+        pending.push(installedMap[key]);
+      }
     }
     this._installed = installed;
+    if (pending.length > 0) {
+      this.updateOutdated(pending);
+    }
+    this.mergeSearchResult();
+    this.stateChanged.emit(undefined);
+  }
 
-    let searchResult: IEntry[] = [];
-    for (let key of Object.keys(searchMap)) {
-      if (installedMap[key] === undefined) {
-        searchResult.push(searchMap[key]);
-      } else {
-        searchResult.push(installedMap[key]);
-      }
+  /**
+   * Update the search results from the NPM repository.
+   *
+   * Any search still in flight is aborted, and its results discarded.
+   */
+  protected async updateSearch() {
+    if (this._searchTimer !== null) {
+      clearTimeout(this._searchTimer);
+      this._searchTimer = null;
+    }
+    if (this._searchAbort !== null) {
+      this._searchAbort.abort();
     }
-    this._searchResult = searchResult;
+    const abort = typeof AbortController !== 'undefined' ? new AbortController() : null;
+    this._searchAbort = abort;
+    const searchId = ++this._searchId;
+    let search = this.searcher.searchExtensions(
+      this.query, this.page, this.pagination, abort ? abort.signal : undefined);
+    let searchMap: {[key: string]: IEntry};
+    let totalEntries: number;
+    let searchError: string | null = null;
     try {
-      this._totalEntries = (await search).total;
-    } catch (error) {
-      this._totalEntries = 0;
+      searchMap = await this.translateSearchResult(search);
+      totalEntries = (await search).total;
+    } catch (reason) {
+      searchMap = {};
+      totalEntries = 0;
+      searchError = reason.toString();
     }
+    if (searchId !== this._searchId) {
+      // Superseded by a newer search
+      return;
+    }
+    this._searchAbort = null;
+    this._searchMap = searchMap;
+    this._totalEntries = totalEntries;
+    this.searchError = searchError;
+    this.mergeSearchResult();
     this.stateChanged.emit(undefined);
+    this.updateCompatibility(searchId);
+  }
+
+  /**
+   * Combine the latest search results with the installed extensions.
+   */
+  protected mergeSearchResult(): void {
+    const installedMap: {[key: string]: IEntry} = {};
+    for (let entry of this._installed) {
+      installedMap[entry.name] = entry;
+    }
+    this._searchResult = Object.keys(this._searchMap).map((key) => {
+      return installedMap[key] || this._searchMap[key];
+    });
   }
 
   /**
@@ -358,7 +644,7 @@ class ListModel extends VDomModel {
         if (data.status !== 'ok') {
           reportInstallError(entry.name, data.message);
         }
-        this.update();
+        this.updateAfterAction();
       });
     }
     this.checkCompanionPackages(entry).then((shouldInstall) => {
@@ -367,7 +653,7 @@ class ListModel extends VDomModel {
           if (data.status !== 'ok') {
             reportInstallError(entry.name, data.message);
           }
-          this.update();
+          this.updateAfterAction();
         });
       }
     })
@@ -383,7 +669,7 @@ class ListModel extends VDomModel {
       throw new Error(`Not installed, cannot uninstall: ${entry.name}`);
     }
     this._performAction('uninstall', entry).then((data) => {
-      this.update();
+      this.updateAfterAction();
     });
   }
 
@@ -397,7 +683,7 @@ class ListModel extends VDomModel {
       throw new Error(`Already enabled: ${entry.name}`);
     }
     this._performAction('enable', entry).then((data) => {
-      this.update();
+      this.updateAfterAction();
     });
   }
 
@@ -411,7 +697,7 @@ class ListModel extends VDomModel {
       throw new Error(`Already disabled: ${entry.name}`);
     }
     this._performAction('disable', entry).then((data) => {
-      this.update();
+      this.updateAfterAction();
     });
   }
 
@@ -421,11 +707,10 @@ class ListModel extends VDomModel {
    * @param entry An entry indicating which extension to check.
    */
   checkCompanionPackages(entry: IEntry): Promise<boolean> {
-    return this.searcher.fetchPackageData(entry.name, entry.latest_version).then((data) => {
-      if (!data || !data.jupyterlab || !data.jupyterlab.discovery) {
+    return this.fetchDiscoveryMetadata(entry).then((discovery) => {
+      if (!discovery) {
         return true;
       }
-      let discovery = data.jupyterlab.discovery;
       let kernelCompanions: {kernelInfo: IKernelInstallInfo, kernels: Kernel.ISpecModel[]}[] = [];
       if (discovery.kernel) {
         // match specs
@@ -441,6 +726,34 @@ class ListModel extends VDomModel {
     });
   }
 
+  /**
+   * Get the discovery metadata of an extension.
+   *
+   * In offline mode, the server has it in its compatibility database.
+   * Otherwise, it is read from the registry.
+   *
+   * @param entry An entry indicating which extension to get it for.
+   */
+  protected fetchDiscoveryMetadata(entry: IEntry): Promise<IDiscoveryMetadata | null> {
+    const url = new URL(COMPANIONS_API_PATH, this.serverConnectionSettings.baseUrl);
+    url.searchParams.append('name', entry.name);
+    if (entry.latest_version) {
+      url.searchParams.append('version', entry.latest_version);
+    }
+    return ServerConnection.makeRequest(
+      url.toString(), {}, this.serverConnectionSettings).then((response) => {
+        handleError(response);
+        return response.json() as Promise<{offline: boolean, discovery?: IDiscoveryMetadata | null}>;
+      }).then((reply): Promise<IDiscoveryMetadata | null> => {
+        if (reply.offline) {
+          return Promise.resolve(reply.discovery || null);
+        }
+        return this.searcher.fetchPackageData(entry.name, entry.latest_version || 'latest').then((data) => {
+          return data && data.jupyterlab && data.jupyterlab.discovery || null;
+        });
+      });
+  }
+
   /**
    * Trigger a build check to incorporate actions taken.
    */
@@ -451,7 +764,7 @@ class ListModel extends VDomModel {
         if (response.status === 'building') {
           // Piggy-back onto existing build
           // TODO: Can this cause dialog collision on build completion?
-          return doBuild(builder);
+          return joinBuild(builder);
         }
         if (response.status !== 'needed') {
           return;
@@ -473,7 +786,7 @@ class ListModel extends VDomModel {
       this.promptBuild = false;
       this.stateChanged.emit(undefined);
     }
-    const completed = doBuild(this.serviceManager.builder);
+    const completed = doBuild(this.serverConnectionSettings);
     this._addPendingAction(completed);
   }
 
@@ -488,10 +801,10 @@ class ListModel extends VDomModel {
   }
 
   /**
-   * Ignore a build recommendation
+   * Refresh the installed extensions, including their latest versions.
    */
   refreshInstalled(): void {
-    const refresh = this.update(true);
+    const refresh = this.updateInstalled(true);
     this._addPendingAction(refresh);
   }
 
@@ -515,14 +828,25 @@ class ListModel extends VDomModel {
    */
   promptBuild: boolean = false;
 
+  /**
+   * The number of milliseconds to wait for more input before searching.
+   */
+  searchDebounce: number = 300;
+
   private _query: string = '';
   private _page: number = 0;
   private _pagination: number = 250;
   private _totalEntries: number = 0;
 
+  private _searchTimer: number | null = null;
+  private _searchAbort: AbortController | null = null;
+  private _searchId: number = 0;
+
   protected _installed: IEntry[];
   protected _searchResult: IEntry[];
+  protected _searchMap: {[key: string]: IEntry} = {};
   protected _pendingActions: Promise<any>[] = [];
+  protected _events: WebSocket | null = null;
 
   /**
    * Settings for connecting to the notebook server.
@@ -575,6 +899,25 @@ function matchSpecs(kernelInfo: IKernelInstallInfo, specs: Kernel.ISpecModels |
 }
 
 
+/**
+ * Translate an installed extension entry from the server into an entry.
+ *
+ * @param pkg The installed extension info from the server.
+ */
+function installedToEntry(pkg: IInstalledEntry): IEntry {
+  return {
+    name: pkg.name,
+    description: pkg.description,
+    installed: pkg.installed !== false,
+    enabled: pkg.enabled,
+    status: pkg.status,
+    // Leave empty until the server has checked for the latest version:
+    latest_version: pkg.latest_version_pending ? null : pkg.latest_version,
+    installed_version: pkg.installed_version,
+  };
+}
+
+
 function handleError(response: Response): Response {
   if (!response.ok) {
     throw new Error(`${response.status} (${response.statusText})`);
@@ -109,14 +109,84 @@ interface IJupyterLabPackageData {
 }
 
 
+/**
+ * A least recently used cache of search results.
+ *
+ * Entries expire after `ttl` milliseconds, and the least recently used
+ * entries are evicted when the total size exceeds `maxBytes`.
+ */
+class SearchCache {
+  constructor(ttl: number, maxBytes: number) {
+    this.ttl = ttl;
+    this.maxBytes = maxBytes;
+  }
+
+  /**
+   * Get a cached result, or undefined if missing or expired.
+   */
+  get(key: string): ISearchResult | undefined {
+    const entry = this._entries[key];
+    if (entry === undefined) {
+      return undefined;
+    }
+    this._remove(key);
+    if (entry.expires < Date.now()) {
+      return undefined;
+    }
+    // Reinsert as the most recently used:
+    this._entries[key] = entry;
+    this._order.push(key);
+    this._bytes += entry.size;
+    return entry.value;
+  }
+
+  /**
+   * Add a result, whose serialized size is `size` bytes.
+   */
+  set(key: string, value: ISearchResult, size: number): void {
+    this._remove(key);
+    if (size > this.maxBytes) {
+      return;
+    }
+    this._entries[key] = {value, size, expires: Date.now() + this.ttl};
+    this._order.push(key);
+    this._bytes += size;
+    while (this._bytes > this.maxBytes) {
+      this._remove(this._order[0]);
+    }
+  }
+
+  private _remove(key: string): void {
+    const entry = this._entries[key];
+    if (entry === undefined) {
+      return;
+    }
+    delete this._entries[key];
+    this._order.splice(this._order.indexOf(key), 1);
+    this._bytes -= entry.size;
+  }
+
+  ttl: number;
+  maxBytes: number;
+
+  private _entries: {[key: string]: {value: ISearchResult, size: number, expires: number}} = {};
+  private _order: string[] = [];
+  private _bytes = 0;
+}
+
+
 /**
  * Searches the NPM registry via web API: https://github.com/npm/registry/blob/master/docs/REGISTRY-API.md
+ *
+ * Search results are cached, and the next page of a search is prefetched
+ * in the background, so that paging through results is fast.
  */
 export
 class Searcher {
 
-  constructor(repoUri='https://registry.npmjs.org/') {
+  constructor(repoUri='https://registry.npmjs.org/', cacheTTL=5 * 60 * 1000, cacheMaxBytes=8 * 1024 * 1024) {
     this.repoUri = repoUri;
+    this._cache = new SearchCache(cacheTTL, cacheMaxBytes);
   }
 
   /**
@@ -125,20 +195,56 @@ class Searcher {
    * @param query The query to send. `keywords:"jupyterlab-extension"` will be appended to the query.
    * @param page The page of results to fetch.
    * @param pageination The pagination size to use. See registry API documentation for acceptable values.
+   * @param signal An optional signal for aborting the search.
    */
-  searchExtensions(query: string, page=0, pageination=250): Promise<ISearchResult> {
+  searchExtensions(query: string, page=0, pageination=250, signal?: AbortSignal): Promise<ISearchResult> {
+    const result = this._search(query, page, pageination, signal);
+    result.then((res) => {
+      if (res.total > (page + 1) * pageination) {
+        // Prefetch the next page, without reporting errors:
+        this._search(query, page + 1, pageination).catch(() => {});
+      }
+    }, () => {});
+    return result;
+  }
+
+  /**
+   * Search for a jupyterlab extension, using cached results if available.
+   */
+  private _search(query: string, page: number, pageination: number, signal?: AbortSignal): Promise<ISearchResult> {
+    const key = JSON.stringify([query, page, pageination]);
+    const cached = this._cache.get(key);
+    if (cached !== undefined) {
+      return Promise.resolve(cached);
+    }
+    if (this._inflight[key] !== undefined) {
+      return this._inflight[key];
+    }
     const uri = new URL('/-/v1/search', this.repoUri);
     // Note: Spaces are encoded to '+' signs!
     let text = `${query} keywords:"jupyterlab-extension"`
     uri.searchParams.append('text', text);
     uri.searchParams.append('size', pageination.toString());
     uri.searchParams.append('from', (pageination * page).toString());
-    return fetch(uri.toString()).then((response: Response) => {
-      if (response.ok) {
-        return response.json();
+    const request = fetch(uri.toString(), {signal}).then((response: Response) => {
+      if (!response.ok) {
+        return [] as any;
       }
-      return [];
+      return response.text().then((body) => {
+        const res = JSON.parse(body) as ISearchResult;
+        this._cache.set(key, res, body.length);
+        return res;
+      });
     });
+    if (!signal) {
+      // Requests that cannot be aborted can be shared:
+      this._inflight[key] = request;
+      const remove = () => {
+        delete this._inflight[key];
+      };
+      request.then(remove, remove);
+    }
+    return request;
   }
 
   /**
@@ -158,4 +264,7 @@ class Searcher {
   }
 
   repoUri: string;
+
+  private _cache: SearchCache;
+  private _inflight: {[key: string]: Promise<ISearchResult>} = {};
 }
@@ -119,8 +119,18 @@ namespace BuildPrompt {
 
 /**
  * VDOM for visualizing an extension entry.
+ *
+ * The entry is only re-rendered when its properties change, so entries
+ * should be replaced, not mutated, when they change.
  */
-function ListEntry(props: ListEntry.IProperties): React.ReactElement<any> {
+export
+class ListEntry extends React.PureComponent<ListEntry.IProperties> {
+  render(): React.ReactElement<any> {
+    return renderEntry(this.props);
+  }
+}
+
+function renderEntry(props: ListEntry.IProperties): React.ReactElement<any> {
   const {entry} = props;
   const flagClasses = [];
   if (entry.installed) {
@@ -135,11 +145,23 @@ function ListEntry(props: ListEntry.IProperties): React.ReactElement<any> {
   if (entry.status && ['ok', 'warning', 'error'].indexOf(entry.status) !== -1) {
     flagClasses.push(`jp-discovery-entry-${entry.status}`);
   }
+  let incompatible;
+  if (!entry.installed && entry.compatibility && entry.compatibility.status === 'incompatible') {
+    flagClasses.push('jp-discovery-entry-incompatible');
+    incompatible = (
+      <div className='jp-discovery-entry-incompatibility'>
+        Incompatible with this version of JupyterLab: {entry.compatibility.message}
+      </div>
+    );
+  }
   return (
     <li className={`jp-discovery-entry ${flagClasses.join(' ')}`}>
       <div className='jp-discovery-entry-name'>{entry.name}</div>
       <div className='jp-discovery-entry-content'>
-        <div className='jp-discovery-entry-description'>{entry.description}</div>
+        <div className='jp-discovery-entry-description'>
+          {entry.description}
+          {incompatible}
+        </div>
         <div className='jp-discovery-entry-buttons'>
           <button
             className='jp-discovery-install'
@@ -197,45 +219,179 @@ namespace ListEntry {
 
 /**
  * List view widget for extensions
+ *
+ * Only the entries in or near the visible part of the scrolled content
+ * are rendered. The heights of entries that have not been rendered are
+ * estimated, and the space they take up is filled with padding.
  */
 export
-function ListView(props: ListView.IProperties): React.ReactElement<any> {
-  const entryViews = [];
-  for (let entry of props.entries) {
-    entryViews.push(
-      <ListEntry entry={entry} key={entry.name} performAction={props.performAction}/>
-    );
+class ListView extends React.Component<ListView.IProperties, ListView.IState> {
+  constructor(props: ListView.IProperties) {
+    super(props);
+    this.state = {
+      windowTop: 0,
+      windowHeight: ListView.initialWindowHeight,
+    };
+    this._onScroll = this._onScroll.bind(this);
   }
-  let pagination;
-  if (props.numPages > 1) {
-    pagination = (
-      <div className='jp-discovery-pagination'>
-        <ReactPaginate previousLabel={"<"}
-                       nextLabel={">"}
-                       breakLabel={<a href="">...</a>}
-                       breakClassName={"break-me"}
-                       pageCount={props.numPages}
-                       marginPagesDisplayed={2}
-                       pageRangeDisplayed={5}
-                       onPageChange={(data: {selected: number}) => props.onPage(data.selected)}
-                       containerClassName={"pagination"}
-                       activeClassName={"active"} />
+
+  render(): React.ReactElement<any> {
+    const {entries} = this.props;
+    // Find the entries that overlap the window:
+    const top = this.state.windowTop - ListView.overscan;
+    const bottom = this.state.windowTop + this.state.windowHeight + ListView.overscan;
+    let start = 0;
+    let end = 0;
+    let before = 0;
+    let after = 0;
+    let offset = 0;
+    for (let i = 0; i < entries.length; ++i) {
+      const height = this._rowHeight(entries[i]);
+      if (offset + height <= top) {
+        start = i + 1;
+        before += height;
+      } else if (offset < bottom) {
+        end = i + 1;
+      } else {
+        after += height;
+      }
+      offset += height;
+    }
+    this._rendered = entries.slice(start, Math.max(start, end));
+
+    const entryViews = [];
+    for (let entry of this._rendered) {
+      entryViews.push(
+        <ListEntry entry={entry} key={entry.name} performAction={this.props.performAction}/>
+      );
+    }
+    let pagination;
+    if (this.props.numPages > 1) {
+      pagination = (
+        <div className='jp-discovery-pagination'>
+          <ReactPaginate previousLabel={"<"}
+                         nextLabel={">"}
+                         breakLabel={<a href="">...</a>}
+                         breakClassName={"break-me"}
+                         pageCount={this.props.numPages}
+                         marginPagesDisplayed={2}
+                         pageRangeDisplayed={5}
+                         onPageChange={(data: {selected: number}) => this.props.onPage(data.selected)}
+                         containerClassName={"pagination"}
+                         activeClassName={"active"} />
+        </div>
+      );
+    }
+    const listview = (
+      <ul
+        className='jp-discovery-listview'
+        style={{paddingTop: before, paddingBottom: after}}
+        ref={(node) => { this._list = node; }}
+      >
+        {entryViews}
+      </ul>
+    )
+    return (
+      <div className='jp-discovery-listview-wrapper' ref={(node) => { this._node = node; }}>
+        {
+          entries.length > 0 ? listview : <div key="message" className="jp-discovery-listview-message">No entries</div>
+        }
+        {pagination}
       </div>
     );
   }
-  const listview = (
-    <ul className='jp-discovery-listview'>
-      {entryViews}
-    </ul>
-  )
-  return (
-    <div className='jp-discovery-listview-wrapper'>
-      {
-        entryViews.length > 0 ? listview : <div key="message" className="jp-discovery-listview-message">No entries</div>
+
+  componentDidMount() {
+    this._container = this._node ? this._node.closest('.jp-discovery-content') : null;
+    if (this._container) {
+      this._container.addEventListener('scroll', this._onScroll);
+    }
+    window.addEventListener('resize', this._onScroll);
+    this._updateWindow();
+    this._measure();
+  }
+
+  componentDidUpdate() {
+    this._measure();
+  }
+
+  componentWillUnmount() {
+    if (this._container) {
+      this._container.removeEventListener('scroll', this._onScroll);
+    }
+    window.removeEventListener('resize', this._onScroll);
+    if (this._frame !== null) {
+      cancelAnimationFrame(this._frame);
+    }
+  }
+
+  /**
+   * The height of an entry, as last measured or estimated.
+   */
+  private _rowHeight(entry: IEntry): number {
+    return this._heights[entry.name] || ListView.estimatedRowHeight;
+  }
+
+  /**
+   * Measure the heights of the rendered entries.
+   *
+   * Re-renders if any height differs from what was assumed.
+   */
+  private _measure(): void {
+    if (!this._list) {
+      return;
+    }
+    let changed = false;
+    const rows = this._list.children;
+    for (let i = 0; i < rows.length && i < this._rendered.length; ++i) {
+      const height = (rows[i] as HTMLElement).offsetHeight;
+      const name = this._rendered[i].name;
+      if (height > 0 && this._heights[name] !== height) {
+        this._heights[name] = height;
+        changed = true;
       }
-      {pagination}
-    </div>
-  );
+    }
+    if (changed) {
+      this.forceUpdate();
+    }
+  }
+
+  /**
+   * Handle scrolling and resizing, at most once per frame.
+   */
+  private _onScroll(): void {
+    if (this._frame === null) {
+      this._frame = requestAnimationFrame(() => {
+        this._frame = null;
+        this._updateWindow();
+      });
+    }
+  }
+
+  /**
+   * Update the visible window, relative to the top of the list.
+   */
+  private _updateWindow(): void {
+    if (!this._node) {
+      return;
+    }
+    let windowTop = 0;
+    let windowHeight = Infinity;
+    if (this._container) {
+      windowTop = this._container.getBoundingClientRect().top - this._node.getBoundingClientRect().top;
+      windowHeight = this._container.clientHeight;
+    }
+    if (windowTop !== this.state.windowTop || windowHeight !== this.state.windowHeight) {
+      this.setState({windowTop, windowHeight});
+    }
+  }
+
+  private _node: HTMLElement | null = null;
+  private _list: HTMLElement | null = null;
+  private _container: Element | null = null;
+  private _frame: number | null = null;
+  private _rendered: ReadonlyArray<IEntry> = [];
+  private _heights: {[key: string]: number} = {};
 }
 
 export
@@ -262,6 +418,37 @@ namespace ListView {
      */
     performAction: (action: Action, entry: IEntry) => void;
   }
+
+  export
+  interface IState {
+    /**
+     * The top of the visible window, relative to the top of the list.
+     */
+    windowTop: number;
+
+    /**
+     * The height of the visible window.
+     */
+    windowHeight: number;
+  }
+
+  /**
+   * The height to assume for entries that have not been rendered yet.
+   */
+  export
+  const estimatedRowHeight = 60;
+
+  /**
+   * The distance outside the visible window in which entries are rendered.
+   */
+  export
+  const overscan = 300;
+
+  /**
+   * The window height to assume before the list has been attached.
+   */
+  export
+  const initialWindowHeight = 1000;
 }
 
 
@@ -274,6 +461,8 @@ class ExtensionView extends VDomRenderer<ListModel> {
     super();
     this.model = new ListModel(serviceManager);
     this.addClass('jp-discovery-view');
+    // Bind once, so that entries are not re-rendered because of it:
+    this.onAction = this.onAction.bind(this);
   }
 
   /**
@@ -346,7 +535,7 @@ class ExtensionView extends VDomRenderer<ListModel> {
           entries={model.installed}
           numPages={1}
           onPage={(value) => {}}
-          performAction={this.onAction.bind(this)}
+          performAction={this.onAction}
           />,
       );
     } else if (model.searchError === null) {
@@ -357,7 +546,7 @@ class ExtensionView extends VDomRenderer<ListModel> {
           entries={model.searchResult}
           numPages={pages}
           onPage={(value) => { this.onPage(value); }}
-          performAction={this.onAction.bind(this)}
+          performAction={this.onAction}
         />,
       );
     } else {